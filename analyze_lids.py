@@ -15,110 +15,179 @@ Usage:
 """
 
 import re
+import struct
 import sys
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
 
 # ================================================================
 # Parser
 # ================================================================
 
-# Matches: LID 0x0A [12]: [87 01 A3 87 01 02 87 01 04 87 01 80]
-LID_RE = re.compile(
-    r"LID\s+0x([0-9A-Fa-f]{2})\s+\[\s*(\d+)\]:\s+\[((?:[0-9A-Fa-f]{2}\s*)+)\]"
-)
-
-
-def parse_lid_line(line):
-    """Parse one LID line. Returns (lid_num, [bytes]) or None."""
-    m = LID_RE.search(line)
-    if not m:
-        return None
-    lid = int(m.group(1), 16)
-    raw = [int(x, 16) for x in m.group(3).split()]
-    return lid, raw
-
-
-def parse_capture(text):
-    """Parse a full capture (one run of read_all_lids).
-    Returns dict: {lid_num: [bytes]}."""
-    result = {}
-    for line in text.splitlines():
-        parsed = parse_lid_line(line)
-        if parsed:
-            lid, data = parsed
-            result[lid] = data
-    return result
+# Matches the tag of: LID 0x0A [12]: [87 01 A3 87 01 02 87 01 04 87 01 80]
+LID_TAG_RE = re.compile(rb"LID\s+0x([0-9A-Fa-f]{2})(?=\s)", re.ASCII)
+
+# Capture boundaries: explicit '---' or a new read_all_lids / scan header
+SEP_RE = re.compile(rb"---|Reading LIDs|PHASE 1", re.ASCII)
+
+# Bound matchers (skip the attribute lookup in the parse loop)
+_TAG_FINDITER = LID_TAG_RE.finditer
+_SEP_FINDITER = SEP_RE.finditer
+
+
+def iter_lids(buf):
+    """Scan raw capture bytes for LID lines.
+    Finds each 'LID 0xNN' tag with a small regex, then checks the
+    '[len]: [..]' layout within the rest of that line only.
+    Yields (offset, lid_num, bytes)."""
+    find = buf.find
+    n = len(buf)
+    for m in _TAG_FINDITER(buf):
+        eol = find(b"\n", m.end())
+        if eol < 0:
+            eol = n
+        # "[12]: [..]" — also accepts the "[ 6]" padded length
+        rest = buf[m.end():eol].lstrip()
+        close = rest.find(b"]:")
+        if close < 0 or rest[:1] != b"[" or not rest[1:close].strip().isdigit():
+            continue
+        data = rest[close + 2:]
+        if not data[:1].isspace():
+            continue
+        data = data.lstrip()
+        end = data.find(b"]")
+        if data[:1] != b"[" or end < 2:
+            continue
+        try:
+            raw = bytes.fromhex(data[1:end].decode())
+        except ValueError:
+            continue
+        if not raw:     # "[ ]" is whitespace only, not a record
+            continue
+        yield m.start(), int(m.group(1), 16), raw
 
 
-def parse_all_captures(text):
-    """Split text into multiple captures (separated by 'Reading LIDs' or 'PHASE 1').
+def parse_captures(text):
+    """Split raw capture bytes into captures in a single scan.
+    Captures are separated by '---', 'Reading LIDs' or 'PHASE 1' markers.
     Returns list of dicts."""
-    # Split on "Reading LIDs" header or "PHASE 1" marker
-    blocks = re.split(r"(?:Reading LIDs|PHASE 1)", text)
-    captures = []
-    for block in blocks:
-        cap = parse_capture(block)
-        if cap:
-            captures.append(cap)
-    return captures
+    seps = [m.start() for m in _SEP_FINDITER(text)]
+    buckets = [{} for _ in range(len(seps) + 1)]
+    for off, lid, data in iter_lids(text):
+        buckets[bisect_right(seps, off)][lid] = data
+    return [cap for cap in buckets if cap]
 
 
 # ================================================================
 # Channel extraction
 # ================================================================
 
-def extract_channels(data):
-    """Extract 4 channels from 12-byte LID data.
-    Returns list of (formula, value_16bit) tuples."""
-    channels = []
-    for i in range(0, min(len(data), 12) - 2, 3):
-        formula = data[i]
-        val = (data[i + 1] << 8) | data[i + 2]
-        channels.append((formula, val))
-    return channels
+# One channel = [formula, high, low]
+_CH_UNPACK = struct.Struct(">BH").iter_unpack
 
 
 # ================================================================
 # Analysis
 # ================================================================
 
+LID_LEN = 12        # bytes per LID record
+N_CH = 4            # channels per LID record
+
+
+def capture_lids(captures):
+    """Sorted list of every LID seen in any capture."""
+    seen = bytearray(256)
+    for cap in captures:
+        for lid in cap:
+            seen[lid] = 1
+    return [lid for lid, hit in enumerate(seen) if hit]
+
+
+def pack_captures(captures, lids):
+    """Pack captures into one contiguous buffer laid out as
+    [capture][lid][12 bytes], padded with 0xFF.
+    Returns (buf, nch) where nch[capture * len(lids) + lid_index] is the
+    number of channels read for that slot (0 = LID missing)."""
+    index = {lid: li for li, lid in enumerate(lids)}
+    n_lid = len(lids)
+    buf = bytearray(b"\xff" * (len(captures) * n_lid * LID_LEN))
+    nch = bytearray(len(captures) * n_lid)
+    for c, cap in enumerate(captures):
+        for lid, data in cap.items():
+            k = c * n_lid + index[lid]
+            data = data[:LID_LEN]
+            buf[k * LID_LEN:k * LID_LEN + len(data)] = data
+            nch[k] = len(data) // 3
+    return buf, nch
+
+
+def channel_minmax(buf, nch, n_cap, n_lid, mn, mx):
+    """Fused min/max reduction over the packed buffer.
+    Writes into caller-provided mn/mx arrays indexed
+    [lid_index * N_CH + channel]; channels never read get 0xFFFF / 0.
+    Each (lid, channel) is reduced independently in local variables."""
+    stride = n_lid * LID_LEN
+    for li in range(n_lid):
+        for ci in range(N_CH):
+            lo = 0xFFFF
+            hi = 0
+            off = li * LID_LEN + ci * 3
+            k = li
+            for _ in range(n_cap):
+                if nch[k] > ci:
+                    v = (buf[off + 1] << 8) | buf[off + 2]
+                    if v < lo:
+                        lo = v
+                    if v > hi:
+                        hi = v
+                off += stride
+                k += n_lid
+            mn[li * N_CH + ci] = lo
+            mx[li * N_CH + ci] = hi
+
+
 def analyze_captures(captures):
     """Analyze multiple captures of the same LIDs.
-    Returns per-LID, per-channel statistics."""
+    Returns {lid: [channel stats, ...]} with LIDs in ascending order
+    and channels in read order."""
 
-    all_lids = sorted(set().union(*[c.keys() for c in captures]))
-    stats = {}
+    all_lids = capture_lids(captures)
+    n_cap = len(captures)
+    n_lid = len(all_lids)
+    buf, nch = pack_captures(captures, all_lids)
+
+    # 16-bit channel values, laid out [capture][lid][channel]
+    vals = array("H", [v for _, v in _CH_UNPACK(buf)])
+
+    mn = array("H", bytes(2 * n_lid * N_CH))
+    mx = array("H", bytes(2 * n_lid * N_CH))
+    channel_minmax(buf, nch, n_cap, n_lid, mn, mx)
 
-    for lid in all_lids:
-        ch_values = defaultdict(list)  # ch_index -> [values across captures]
-        ch_raw = defaultdict(list)     # ch_index -> [(hi, lo) across captures]
-
-        for cap in captures:
-            if lid not in cap:
-                continue
-            data = cap[lid]
-            channels = extract_channels(data)
-            for ci, (formula, val) in enumerate(channels):
-                ch_values[ci].append(val)
-                hi = data[ci * 3 + 1] if ci * 3 + 1 < len(data) else 0
-                lo = data[ci * 3 + 2] if ci * 3 + 2 < len(data) else 0
-                ch_raw[ci].append((hi, lo))
-
-        lid_stats = {}
-        for ci in sorted(ch_values.keys()):
-            vals = ch_values[ci]
-            raw = ch_raw[ci]
-            unique = sorted(set(vals))
-            lid_stats[ci] = {
-                "values": vals,
+    stats = {}
+    for li, lid in enumerate(all_lids):
+        lid_stats = []
+        for ci in range(N_CH):
+            slots = [c * n_lid + li for c in range(n_cap)
+                     if nch[c * n_lid + li] > ci]
+            if not slots:
+                break
+            col = [vals[k * N_CH + ci] for k in slots]
+            raw = [(buf[k * LID_LEN + ci * 3 + 1], buf[k * LID_LEN + ci * 3 + 2])
+                   for k in slots]
+            lo = mn[li * N_CH + ci]
+            hi = mx[li * N_CH + ci]
+            # Static channels need no hashing: the only value is min
+            unique = [lo] if lo == hi else sorted(set(col))
+            lid_stats.append({
+                "values": col,
                 "raw": raw,
-                "min": min(vals),
-                "max": max(vals),
-                "range": max(vals) - min(vals),
+                "min": lo,
+                "max": hi,
+                "range": hi - lo,
                 "unique": unique,
-                "static": len(unique) == 1,
-                "n": len(vals),
-            }
+                "static": lo == hi,
+                "n": len(col),
+            })
         stats[lid] = lid_stats
 
     return stats
@@ -128,30 +197,46 @@ def analyze_captures(captures):
 # Display
 # ================================================================
 
-BOLD = "\033[1m"
-DIM = "\033[2m"
-RED = "\033[91m"
-GREEN = "\033[92m"
-YELLOW = "\033[93m"
-CYAN = "\033[96m"
-RESET = "\033[0m"
+# No ANSI escapes when piped to a file or another tool
+_TTY = sys.stdout.isatty()
+
+BOLD = "\033[1m" if _TTY else ""
+DIM = "\033[2m" if _TTY else ""
+RED = "\033[91m" if _TTY else ""
+GREEN = "\033[92m" if _TTY else ""
+YELLOW = "\033[93m" if _TTY else ""
+CYAN = "\033[96m" if _TTY else ""
+RESET = "\033[0m" if _TTY else ""
+
+# Preformatted LID numbers
+HEX2 = ["0x%02X" % b for b in range(256)]
+
+
+def hex4_table(stats):
+    """Map every channel value seen in stats to its "0x%04X" string."""
+    seen = set()
+    for chans in stats.values():
+        for s in chans:
+            seen.update(s["unique"])
+    return {v: "0x%04X" % v for v in seen}
 
 
 def print_summary(stats, captures):
     """Print a summary table of all LIDs and their channels."""
 
     n_cap = len(captures)
-    print()
-    print(f"{BOLD}{'=' * 78}{RESET}")
-    print(f"{BOLD} LID Channel Analysis — {n_cap} capture(s){RESET}")
-    print(f"{BOLD}{'=' * 78}{RESET}")
+    hex4 = hex4_table(stats)
+    out = [""]
+    out.append(f"{BOLD}{'=' * 78}{RESET}")
+    out.append(f"{BOLD} LID Channel Analysis — {n_cap} capture(s){RESET}")
+    out.append(f"{BOLD}{'=' * 78}{RESET}")
 
     # Classification
     dynamic_lids = []
     static_lids = []
 
-    for lid in sorted(stats.keys()):
-        has_dynamic = any(not s["static"] for s in stats[lid].values())
+    for lid in stats:
+        has_dynamic = any(not s["static"] for s in stats[lid])
         if has_dynamic:
             dynamic_lids.append(lid)
         else:
@@ -159,15 +244,14 @@ def print_summary(stats, captures):
 
     # Dynamic LIDs — full detail
     if dynamic_lids:
-        print(f"\n{BOLD}{YELLOW}--- DYNAMIC LIDs (values change across captures) ---{RESET}\n")
-        print(f"  {'LID':>6}  {'Ch':>3}  {'Min':>7}  {'Max':>7}  {'Range':>6}  {'Uniq':>5}  {'Values'}")
-        print(f"  {'─' * 6}  {'─' * 3}  {'─' * 7}  {'─' * 7}  {'─' * 6}  {'─' * 5}  {'─' * 30}")
+        out.append(f"\n{BOLD}{YELLOW}--- DYNAMIC LIDs (values change across captures) ---{RESET}\n")
+        out.append(f"  {'LID':>6}  {'Ch':>3}  {'Min':>7}  {'Max':>7}  {'Range':>6}  {'Uniq':>5}  {'Values'}")
+        out.append(f"  {'─' * 6}  {'─' * 3}  {'─' * 7}  {'─' * 7}  {'─' * 6}  {'─' * 5}  {'─' * 30}")
 
         for lid in dynamic_lids:
             first = True
-            for ci in sorted(stats[lid].keys()):
-                s = stats[lid][ci]
-                lid_str = "0x%02X" % lid if first else ""
+            for ci, s in enumerate(stats[lid]):
+                lid_str = HEX2[lid] if first else ""
                 first = False
 
                 if s["static"]:
@@ -177,40 +261,40 @@ def print_summary(stats, captures):
                     color = RED if s["range"] > 0x20 else YELLOW
                     tag = " <<<"
 
-                vals_str = ", ".join("0x%04X" % v for v in s["unique"][:8])
+                vals_str = ", ".join(hex4[v] for v in s["unique"][:8])
                 if len(s["unique"]) > 8:
                     vals_str += "..."
 
-                print(f"  {color}{lid_str:>6}  ch{ci:>1}  "
-                      f"0x{s['min']:04X}  0x{s['max']:04X}  "
-                      f"{s['range']:5d}  {len(s['unique']):5d}  "
-                      f"{vals_str}{tag}{RESET}")
-            print()
+                out.append(f"  {color}{lid_str:>6}  ch{ci:>1}  "
+                           f"{hex4[s['min']]}  {hex4[s['max']]}  "
+                           f"{s['range']:5d}  {len(s['unique']):5d}  "
+                           f"{vals_str}{tag}{RESET}")
+            out.append("")
 
     # Static LIDs — compact
     if static_lids:
-        print(f"\n{DIM}--- STATIC LIDs (no change across captures) ---{RESET}\n")
-        print(f"  {DIM}{'LID':>6}  {'ch0':>7}  {'ch1':>7}  {'ch2':>7}  {'ch3':>7}{RESET}")
-        print(f"  {DIM}{'─' * 6}  {'─' * 7}  {'─' * 7}  {'─' * 7}  {'─' * 7}{RESET}")
+        out.append(f"\n{DIM}--- STATIC LIDs (no change across captures) ---{RESET}\n")
+        out.append(f"  {DIM}{'LID':>6}  {'ch0':>7}  {'ch1':>7}  {'ch2':>7}  {'ch3':>7}{RESET}")
+        out.append(f"  {DIM}{'─' * 6}  {'─' * 7}  {'─' * 7}  {'─' * 7}  {'─' * 7}{RESET}")
 
         for lid in static_lids:
             vals = []
-            for ci in sorted(stats[lid].keys()):
-                s = stats[lid][ci]
-                vals.append("0x%04X" % s["min"])
+            for s in stats[lid]:
+                vals.append(hex4[s["min"]])
             while len(vals) < 4:
                 vals.append("     -")
-            print(f"  {DIM}0x{lid:02X}    {'  '.join(vals)}{RESET}")
+            out.append(f"  {DIM}{HEX2[lid]}    {'  '.join(vals)}{RESET}")
 
-    print()
+    out.append("")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def print_heatmap(stats, captures):
     """Print a capture-by-capture heatmap for dynamic channels."""
 
     dynamic = {}
-    for lid in sorted(stats.keys()):
-        for ci, s in stats[lid].items():
+    for lid in stats:
+        for ci, s in enumerate(stats[lid]):
             if not s["static"]:
                 dynamic[(lid, ci)] = s
 
@@ -218,40 +302,44 @@ def print_heatmap(stats, captures):
         print(f"{DIM}No dynamic channels found.{RESET}")
         return
 
-    print(f"\n{BOLD}{'=' * 78}{RESET}")
-    print(f"{BOLD} Capture-by-Capture Heatmap (dynamic channels only){RESET}")
-    print(f"{BOLD}{'=' * 78}{RESET}\n")
+    hex4 = hex4_table(stats)
+    out = [f"\n{BOLD}{'=' * 78}{RESET}"]
+    out.append(f"{BOLD} Capture-by-Capture Heatmap (dynamic channels only){RESET}")
+    out.append(f"{BOLD}{'=' * 78}{RESET}\n")
 
     # Header
-    hdr = f"  {'LID':>6} {'Ch':>3} |"
+    hdr_parts = [f"  {'LID':>6} {'Ch':>3} |"]
     for i in range(len(captures)):
-        hdr += f" Cap{i:>2} |"
-    hdr += f"  {'Δ':>5}"
-    print(hdr)
-    print("  " + "─" * (len(hdr) - 2))
-
-    for (lid, ci), s in sorted(dynamic.items()):
-        row = f"  0x{lid:02X}  ch{ci} |"
+        hdr_parts.append(f" Cap{i:>2} |")
+    hdr_parts.append(f"  {'Δ':>5}")
+    hdr = "".join(hdr_parts)
+    out.append(hdr)
+    out.append("  " + "─" * (len(hdr) - 2))
+
+    for (lid, ci), s in dynamic.items():
+        row_parts = [f"  {HEX2[lid]}  ch{ci} |"]
         vals = s["values"]
         prev = None
         for v in vals:
             if prev is not None and v != prev:
-                row += f" {RED}0x{v:04X}{RESET} |"
+                row_parts.append(f" {RED}{hex4[v]}{RESET} |")
             else:
-                row += f" 0x{v:04X} |"
+                row_parts.append(f" {hex4[v]} |")
             prev = v
-        row += f"  {s['range']:5d}"
-        print(row)
+        row_parts.append(f"  {s['range']:5d}")
+        out.append("".join(row_parts))
 
-    print()
+    out.append("")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def print_interpreted(stats):
     """Try to interpret known LID mappings based on observed ranges."""
 
-    print(f"\n{BOLD}{'=' * 78}{RESET}")
-    print(f"{BOLD} Interpretation Hints{RESET}")
-    print(f"{BOLD}{'=' * 78}{RESET}\n")
+    hex4 = hex4_table(stats)
+    out = [f"\n{BOLD}{'=' * 78}{RESET}"]
+    out.append(f"{BOLD} Interpretation Hints{RESET}")
+    out.append(f"{BOLD}{'=' * 78}{RESET}\n")
 
     hints = {
         0x00: "Rain counters / status",
@@ -275,20 +363,21 @@ def print_interpreted(stats):
         0x19: "Active sensor data",
     }
 
-    for lid in sorted(stats.keys()):
-        has_dynamic = any(not s["static"] for s in stats[lid].values())
+    for lid in stats:
+        has_dynamic = any(not s["static"] for s in stats[lid])
         if not has_dynamic:
             continue
         hint = hints.get(lid, "unknown")
-        print(f"  LID 0x{lid:02X}: {hint}")
-        for ci, s in sorted(stats[lid].items()):
+        out.append(f"  LID {HEX2[lid]}: {hint}")
+        for ci, s in enumerate(stats[lid]):
             if s["static"]:
-                print(f"    ch{ci}: static = 0x{s['min']:04X} ({s['min']})")
+                out.append(f"    ch{ci}: static = {hex4[s['min']]} ({s['min']})")
             else:
-                print(f"    ch{ci}: {s['min']:5d} - {s['max']:5d}  "
-                      f"(0x{s['min']:04X}-0x{s['max']:04X})  "
-                      f"Δ={s['range']}")
-        print()
+                out.append(f"    ch{ci}: {s['min']:5d} - {s['max']:5d}  "
+                           f"({hex4[s['min']]}-{hex4[s['max']]})  "
+                           f"Δ={s['range']}")
+        out.append("")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 # ================================================================
@@ -296,7 +385,7 @@ def print_interpreted(stats):
 # ================================================================
 
 # Embedded sample data (from the captures in the user's session)
-SAMPLE_DATA = """
+SAMPLE_DATA = b"""
 LID 0x00 [12]: [87 01 00 87 01 00 87 01 00 87 01 02]
 LID 0x01 [12]: [87 01 00 87 01 00 87 01 00 87 01 00]
 LID 0x02 [12]: [87 01 00 87 01 49 87 01 00 87 01 4B]
@@ -527,31 +616,24 @@ LID 0x1F [12]: [87 01 21 87 01 00 87 01 00 87 01 00]
 def main():
     if len(sys.argv) > 1:
         # Read from file(s)
-        text = ""
+        parts = []
         for path in sys.argv[1:]:
-            with open(path, "r") as f:
-                text += f.read() + "\n---\n"
+            with open(path, "rb") as f:
+                parts.append(f.read())
+            parts.append(b"\n---\n")
+        # Scanned as raw bytes; captures are ASCII hex
+        text = b"".join(parts)
     else:
         text = SAMPLE_DATA
 
-    # Parse captures (split on ---  separators)
-    blocks = text.split("---")
-    captures = []
-    for block in blocks:
-        cap = parse_capture(block)
-        if cap:
-            captures.append(cap)
-
-    if not captures:
-        # Try the automatic splitter
-        captures = parse_all_captures(text)
+    captures = parse_captures(text)
 
     if not captures:
         print("No LID data found in input.")
         return
 
     print(f"Parsed {len(captures)} capture(s), "
-          f"{len(set().union(*[c.keys() for c in captures]))} unique LIDs")
+          f"{len(capture_lids(captures))} unique LIDs")
 
     stats = analyze_captures(captures)
     print_summary(stats, captures)
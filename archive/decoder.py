@@ -16,6 +16,9 @@ Usage (from REPL):
 
 import rp2
 from machine import Pin, UART
+from micropython import const
+from array import array
+import select
 import time
 
 
@@ -50,8 +53,30 @@ def _pio_tx():
     wrap()
 
 
+def _find_byte(buf, target, start=0):
+    """Index of the first target byte in buf, or -1 (no bytes([p]) alloc)."""
+    i = start
+    n = len(buf)
+    while i < n:
+        if buf[i] == target:
+            return i
+        i += 1
+    return -1
+
+
+def _calc_pid(fid):
+    """Protected Identifier from 6-bit frame ID (builds _PID_TABLE)."""
+    b = [(fid >> i) & 1 for i in range(6)]
+    p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
+    p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
+    return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+
+
 class LIN:
-    _BRK = 1 << 8
+    _BRK = const(1 << 8)
+    _PID_TABLE = bytes(_calc_pid(i) for i in range(64))
+    # Worst-case 8-byte frame slot at 19200 baud (1.4 x nominal) + margin
+    SLOT_MS = const(12)
 
     def __init__(self, tx=0, rx=1, baud=19200):
         self.uart = UART(0, baudrate=baud, tx=Pin(12), rx=Pin(rx),
@@ -60,22 +85,28 @@ class LIN:
             0, _pio_tx, freq=baud * 8,
             out_base=Pin(tx), set_base=Pin(tx))
         self.sm.active(1)
+        self._poller = select.poll()
+        self._poller.register(self.uart, select.POLLIN)
+        # Reused for every received payload (see recv)
+        self._rx_scratch = bytearray(16)
+        self._rx_mv = memoryview(self._rx_scratch)
+        self._poll_buf = bytearray(16)
+        self._poll_mv = memoryview(self._poll_buf)
+        # _rx() lands UART bytes here and copies out only what arrived
+        self._uart_buf = bytearray(16)
+        self._uart_mv = memoryview(self._uart_buf)
         print("LIN: TX=GPIO%d RX=GPIO%d %dbaud" % (tx, rx, baud))
 
     @staticmethod
     def pid(fid):
-        b = [(fid >> i) & 1 for i in range(6)]
-        p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
-        p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
-        return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+        return LIN._PID_TABLE[fid & 0x3F]
 
     @staticmethod
     def chk(data, pid=None):
-        s = pid if pid is not None else 0
-        for v in data:
-            s += v
-            if s > 255:
-                s -= 255
+        s = sum(data) + (pid if pid is not None else 0)
+        # End-around carry, same as subtracting 255 on each overflow
+        s = (s & 0xFF) + (s >> 8)
+        s = (s & 0xFF) + (s >> 8)
         return (~s) & 0xFF
 
     def _brk(self):
@@ -87,20 +118,22 @@ class LIN:
         time.sleep_us(200)
 
     def _flush(self):
-        while self.uart.any():
-            self.uart.read()
+        self.uart.read()            # drains everything pending, or None
 
     def _rx(self, n=11, tmo=50):
+        mv = self._uart_mv
+        n = min(n, len(mv))
+        off = 0
         t0 = time.ticks_ms()
-        buf = b""
-        while time.ticks_diff(time.ticks_ms(), t0) < tmo:
-            if self.uart.any():
-                c = self.uart.read()
-                if c:
-                    buf += c
-                if len(buf) >= n:
-                    break
-        return buf
+        while off < n:
+            # Block in C until bytes arrive or the time budget runs out
+            rem = tmo - time.ticks_diff(time.ticks_ms(), t0)
+            if rem <= 0 or not self._poller.poll(rem):
+                break
+            k = self.uart.readinto(mv[off:], n - off)
+            if k:
+                off += k
+        return bytes(mv[:off])
 
     def header(self, fid):
         p = self.pid(fid)
@@ -111,27 +144,75 @@ class LIN:
         return p
 
     def send(self, fid, data, enhanced=True):
-        p = self.header(fid)
+        p = self.pid(fid)
+        self.send_precomputed(p, data, self.chk(data, p if enhanced else None))
+
+    def send_precomputed(self, p, data, csum):
+        """send() for a fixed frame: PID and checksum computed once
+        by the caller (p = pid(fid), csum = chk(data, p))."""
+        # Whole frame goes to the PIO FIFO in one put; PIO paces the bytes
+        words = array("I", [self._BRK, 0x55 ^ 0xFF, p ^ 0xFF])
         for b in data:
-            self._tx(b)
-        self._tx(self.chk(data, p if enhanced else None))
+            words.append(b ^ 0xFF)
+        words.append(csum ^ 0xFF)
+        self._flush()
+        self.sm.put(words)
+        while self.sm.tx_fifo():
+            pass
         time.sleep_us(300)
 
     def recv(self, fid, tmo=50):
+        # data is a view into the scratch buffer, valid until next recv
         p = self.header(fid)
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None, False
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = _find_byte(raw, p)
+        if idx < 0:
             return None, False
         pay = raw[idx + 1:]
         if len(pay) < 2:
             return None, False
-        data = list(pay[:-1])
+        n = len(pay) - 1
+        self._rx_scratch[:n] = pay[:-1]
+        data = self._rx_mv[:n]
         return data, pay[-1] == self.chk(data, p)
 
+    def recv_nowait(self, fid):
+        """Send the header for fid and return at once. Returns the PID
+        to hand to poll()."""
+        return self.header(fid)
+
+    def poll(self, p, n=8, tmo=SLOT_MS):
+        """Collect the response to a header sent by recv_nowait().
+        Returns (data, ok) like recv() as soon as n data bytes plus
+        checksum follow the PID, or with whatever arrived within tmo ms."""
+        buf = self._poll_buf
+        mv = self._poll_mv
+        uart = self.uart
+        got = 0
+        idx = -1
+        wait = self._poller.poll
+        t0 = time.ticks_ms()
+        while True:
+            rem = tmo - time.ticks_diff(time.ticks_ms(), t0)
+            if rem <= 0 or not wait(rem):
+                break
+            got += uart.readinto(mv[got:]) or 0
+            if idx < 0:
+                for i in range(got):
+                    if buf[i] == p:
+                        idx = i
+                        break
+            if (idx >= 0 and got >= idx + n + 2) or got >= len(buf):
+                break
+        if idx < 0 or got - idx < 3:
+            return None, False
+        k = min(got - idx - 2, n)
+        self._rx_scratch[:k] = mv[idx + 1:idx + 1 + k]
+        data = self._rx_mv[:k]
+        return data, buf[idx + 1 + k] == self.chk(data, p)
+
 
 # ================================================================
 # Frame Tracker
@@ -139,6 +220,16 @@ class LIN:
 
 FRAME_IDS = [(0x23, "Light"), (0x29, "Env"), (0x30, "Rain")]
 
+# Set-bit count per byte value, for the unique-value bitmaps
+_POP = bytes(bin(i).count("1") for i in range(256))
+
+# Two-digit hex for every byte value
+_HEX = tuple("%02X" % i for i in range(256))
+
+
+def _hx(data):
+    return " ".join(_HEX[b] for b in data)
+
 
 class Frame:
     """Track one frame: data, changes, per-byte statistics."""
@@ -150,9 +241,13 @@ class Frame:
         self.prev = None
         self.count = 0
         self.fails = 0
-        self.mn = [0xFF] * 8
-        self.mx = [0x00] * 8
-        self.uniq = [set() for _ in range(8)]
+        self.mn = bytearray(b"\xff" * 8)
+        self.mx = bytearray(8)
+        # 256-bit seen-value bitmap per byte position
+        self.uniq = [bytearray(32) for _ in range(8)]
+        # Per-byte OR / AND of every sample: set bits that ever varied
+        self.bits_or = bytearray(8)
+        self.bits_and = bytearray(b"\xff" * 8)
 
     def update(self, data):
         if data is None:
@@ -163,12 +258,27 @@ class Frame:
         while len(self.data) < 8:
             self.data.append(0xFF)
         self.count += 1
+        mn = self.mn
+        mx = self.mx
+        uniq = self.uniq
+        bits_or = self.bits_or
+        bits_and = self.bits_and
         for i, b in enumerate(self.data):
-            if b < self.mn[i]:
-                self.mn[i] = b
-            if b > self.mx[i]:
-                self.mx[i] = b
-            self.uniq[i].add(b)
+            if b < mn[i]:
+                mn[i] = b
+            if b > mx[i]:
+                mx[i] = b
+            uniq[i][b >> 3] |= 1 << (b & 7)
+            bits_or[i] |= b
+            bits_and[i] &= b
+
+    def n_uniq(self, i):
+        """Number of distinct values seen at byte position i."""
+        return sum(_POP[x] for x in self.uniq[i])
+
+    def is_static(self, i):
+        """True if byte position i never changed (no bit varied)."""
+        return self.bits_or[i] == self.bits_and[i]
 
     def changed_bytes(self):
         if not self.prev or not self.data:
@@ -181,7 +291,8 @@ class Frame:
         ch = self.changed_bytes()
         parts = []
         for i, b in enumerate(self.data):
-            parts.append(">%02X<" % b if i in ch else " %02X " % b)
+            h = _HEX[b]
+            parts.append(">" + h + "<" if i in ch else " " + h + " ")
         return "".join(parts)
 
     def stats_table(self):
@@ -191,7 +302,7 @@ class Frame:
         ]
         for i in range(8):
             rng = self.mx[i] - self.mn[i]
-            u = len(self.uniq[i])
+            u = self.n_uniq(i)
             if u <= 1:
                 t = "static"
             elif rng <= 0x0F:
@@ -213,12 +324,8 @@ class Frame:
             "  -----+------------------------------------------",
         ]
         for i in range(8):
-            all_or = 0x00
-            all_and = 0xFF
-            for val in self.uniq[i]:
-                all_or |= val
-                all_and &= val
-            varying = all_or ^ all_and
+            all_and = self.bits_and[i]
+            varying = self.bits_or[i] ^ all_and
             pattern = ""
             for bit in range(7, -1, -1):
                 if varying & (1 << bit):
@@ -231,9 +338,11 @@ class Frame:
     def reset(self):
         self.data = self.prev = None
         self.count = self.fails = 0
-        self.mn = [0xFF] * 8
-        self.mx = [0x00] * 8
-        self.uniq = [set() for _ in range(8)]
+        self.mn = bytearray(b"\xff" * 8)
+        self.mx = bytearray(8)
+        self.uniq = [bytearray(32) for _ in range(8)]
+        self.bits_or = bytearray(8)
+        self.bits_and = bytearray(b"\xff" * 8)
 
 
 # ================================================================
@@ -262,13 +371,36 @@ def _dec_rain(d):
     return "Rain=%s(%02X,%02X)" % (tag, d[0], d[1])
 
 
+def _no_dec(d):
+    return ""
+
+
 _DECODERS = {0x23: _dec_light, 0x29: _dec_env, 0x30: _dec_rain}
 
 
+# ================================================================
+# Shared LIN instance
+# ================================================================
+
+_lin = None
+
+
+def _get_lin():
+    global _lin
+    if _lin is None:
+        _lin = LIN()
+    return _lin
+
+
 # ================================================================
 # Live Monitor
 # ================================================================
 
+# Poll cycle period (ms) for live/stats/inject; leftover time is slept
+# once per cycle against a deadline
+CYCLE_MS = const(40)
+
+
 def live(cmd=None, data=None, interval=500):
     """
     Continuous live view of all frames with decoded values and
@@ -278,7 +410,7 @@ def live(cmd=None, data=None, interval=500):
     data:     8-byte payload for master command
     interval: Display refresh interval in ms (default 500)
     """
-    lin = LIN()
+    lin = _get_lin()
     frames = {}
     for fid, name in FRAME_IDS:
         frames[fid] = Frame(fid, name)
@@ -288,34 +420,45 @@ def live(cmd=None, data=None, interval=500):
 
     mode = "PASSIVE"
     if cmd is not None:
-        mode = "CMD 0x%02X [%s]" % (cmd, " ".join("%02X" % b for b in data))
+        mode = "CMD 0x%02X [%s]" % (cmd, _hx(data))
 
     print("\n=== Live: %s | refresh %dms ===" % (mode, interval))
     print("Ctrl+C to stop\n")
 
+    # Resolve frame objects and decoders once, bind hot-loop callables
+    plan = [(fid, name, frames[fid], _DECODERS.get(fid, _no_dec))
+            for fid, name in FRAME_IDS]
+    recv_nowait = lin.recv_nowait
+    poll = lin.poll
+    send = lin.send
+    sleep_ms = time.sleep_ms
+    ticks_ms = time.ticks_ms
+    ticks_add = time.ticks_add
+    ticks_diff = time.ticks_diff
+
     cycle = 0
     last_t = 0
     try:
         while True:
+            deadline = ticks_add(ticks_ms(), CYCLE_MS)
+
             # Master command (if configured)
             if cmd is not None:
-                lin.send(cmd, data)
-                time.sleep_ms(5)
+                send(cmd, data)
+                sleep_ms(5)
 
-            # Poll all slave frames
-            for fid, name in FRAME_IDS:
-                d, ok = lin.recv(fid, tmo=40)
-                frames[fid].update(d if ok else None)
-                time.sleep_ms(2)
+            # Poll all slave frames, each header right after the last slot
+            for fid, name, f, dec_fn in plan:
+                d, ok = poll(recv_nowait(fid))
+                f.update(d if ok else None)
 
             # Display at interval
-            now = time.ticks_ms()
-            if time.ticks_diff(now, last_t) >= interval:
+            now = ticks_ms()
+            if ticks_diff(now, last_t) >= interval:
                 last_t = now
                 print("--- #%d ---" % cycle)
-                for fid, name in FRAME_IDS:
-                    f = frames[fid]
-                    dec = _DECODERS.get(fid, lambda x: "")(f.data)
+                for fid, name, f, dec_fn in plan:
+                    dec = dec_fn(f.data)
                     print("  0x%02X %-5s: %s  n=%d" % (
                         fid, name, f.hex_line(), f.count))
                     if dec:
@@ -323,7 +466,9 @@ def live(cmd=None, data=None, interval=500):
                 print()
 
             cycle += 1
-            time.sleep_ms(10)
+            rem = ticks_diff(deadline, ticks_ms())
+            if rem > 0:
+                sleep_ms(rem)
     except KeyboardInterrupt:
         print("\nStopped. %d cycles." % cycle)
         for fid, name in FRAME_IDS:
@@ -347,7 +492,7 @@ def inject(fid=0x20, data=None, seconds=5):
     if data is None:
         data = [0x81, 0x04, 0x02, 0x00, 0x00, 0x00, 0x00, 0x00]
 
-    lin = LIN()
+    lin = _get_lin()
 
     # Capture baseline
     print("Baseline (0x30)...")
@@ -355,39 +500,44 @@ def inject(fid=0x20, data=None, seconds=5):
     for _ in range(5):
         d, ok = lin.recv(0x30, tmo=50)
         if d and ok:
-            baseline = d
+            baseline = bytes(d)
         time.sleep_ms(20)
     if baseline:
-        print("  [%s]" % " ".join("%02X" % b for b in baseline))
+        print("  [%s]" % _hx(baseline))
     else:
         print("  no response")
 
     # Inject
     print("\nInjecting: 0x%02X [%s] for %ds..." % (
-        fid, " ".join("%02X" % b for b in data), seconds))
+        fid, _hx(data), seconds))
+
+    p = lin.pid(fid)
+    csum = lin.chk(data, p)
 
     t0 = time.ticks_ms()
     n = 0
     changed = False
     while time.ticks_diff(time.ticks_ms(), t0) < seconds * 1000:
-        lin.send(fid, data)
+        deadline = time.ticks_add(time.ticks_ms(), CYCLE_MS)
+        lin.send_precomputed(p, data, csum)
         time.sleep_ms(5)
         d, ok = lin.recv(0x30, tmo=40)
         if d and ok:
+            d = bytes(d)
             if baseline and d != baseline:
                 dt = time.ticks_diff(time.ticks_ms(), t0)
-                print("  +%dms CHANGE: [%s]" % (
-                    dt, " ".join("%02X" % b for b in d)))
+                print("  +%dms CHANGE: [%s]" % (dt, _hx(d)))
                 changed = True
                 baseline = d
             elif n % 50 == 0:
                 dt = time.ticks_diff(time.ticks_ms(), t0)
-                print("  +%dms: [%s]" % (
-                    dt, " ".join("%02X" % b for b in d)))
+                print("  +%dms: [%s]" % (dt, _hx(d)))
         # Keep sensor alive
         lin.recv(0x23, tmo=30)
         n += 1
-        time.sleep_ms(15)
+        rem = time.ticks_diff(deadline, time.ticks_ms())
+        if rem > 0:
+            time.sleep_ms(rem)
 
     if changed:
         print("\n>>> Frame 0x30 changed! This command has effect.")
@@ -404,29 +554,36 @@ def timing(samples=100):
     Measure total frame slot time (header TX + slave response)
     for each frame ID. Reports min/max/avg in microseconds.
     """
-    lin = LIN()
+    lin = _get_lin()
 
     print("\nMeasuring %d samples per frame..." % samples)
     print("  Frame  | Min     | Max     | Avg     | Fail")
     print("  -------+---------+---------+---------+-----")
 
     for fid, name in FRAME_IDS:
-        times = []
+        # Running min/max/total: no per-sample list during measurement
+        mn = 1 << 30
+        mx = 0
+        tot = 0
+        n = 0
         fails = 0
         for _ in range(samples):
             t0 = time.ticks_us()
             d, ok = lin.recv(fid, tmo=50)
             dt = time.ticks_diff(time.ticks_us(), t0)
             if d and ok:
-                times.append(dt)
+                if dt < mn:
+                    mn = dt
+                if dt > mx:
+                    mx = dt
+                tot += dt
+                n += 1
             else:
                 fails += 1
             time.sleep_ms(5)
 
-        if times:
-            mn = min(times)
-            mx = max(times)
-            avg = sum(times) // len(times)
+        if n:
+            avg = tot // n
             print("  0x%02X %s | %5dus | %5dus | %5dus | %d" % (
                 fid, name, mn, mx, avg, fails))
         else:
@@ -446,7 +603,7 @@ def stats(count=100, cmd=None, data=None):
     cmd:   Optional master command frame ID
     data:  Optional master command payload
     """
-    lin = LIN()
+    lin = _get_lin()
     frames = {}
     for fid, name in FRAME_IDS:
         frames[fid] = Frame(fid, name)
@@ -458,18 +615,29 @@ def stats(count=100, cmd=None, data=None):
     if cmd is not None:
         mode = "CMD 0x%02X" % cmd
 
+    plan = [(fid, frames[fid]) for fid, _ in FRAME_IDS]
+    recv_nowait = lin.recv_nowait
+    poll = lin.poll
+    send = lin.send
+    sleep_ms = time.sleep_ms
+    ticks_ms = time.ticks_ms
+    ticks_add = time.ticks_add
+    ticks_diff = time.ticks_diff
+
     print("\nCapturing %d cycles (%s)..." % (count, mode))
     for n in range(count):
+        deadline = ticks_add(ticks_ms(), CYCLE_MS)
         if cmd is not None:
-            lin.send(cmd, data)
-            time.sleep_ms(5)
-        for fid, name in FRAME_IDS:
-            d, ok = lin.recv(fid, tmo=40)
-            frames[fid].update(d if ok else None)
-            time.sleep_ms(2)
+            send(cmd, data)
+            sleep_ms(5)
+        for fid, f in plan:
+            d, ok = poll(recv_nowait(fid))
+            f.update(d if ok else None)
         if n % 25 == 0:
             print("  %d/%d..." % (n, count))
-        time.sleep_ms(10)
+        rem = ticks_diff(deadline, ticks_ms())
+        if rem > 0:
+            sleep_ms(rem)
 
     print("\n" + "=" * 55)
     print(" STATISTICS (%d cycles, %s)" % (count, mode))
@@ -483,8 +651,8 @@ def stats(count=100, cmd=None, data=None):
             print(f.stats_table())
             print()
             print(f.bit_table())
-            vol = [i for i in range(8) if len(f.uniq[i]) > 1]
-            sta = [i for i in range(8) if len(f.uniq[i]) <= 1]
+            vol = [i for i in range(8) if not f.is_static(i)]
+            sta = [i for i in range(8) if f.is_static(i)]
             print("  Volatile: %s" % (vol if vol else "none"))
             print("  Static:   %s" % (sta if sta else "none"))
     print()
@@ -502,7 +670,7 @@ def stimulus(name="test"):
 
     name: Label for the test
     """
-    lin = LIN()
+    lin = _get_lin()
     frames_before = {}
     frames_after = {}
     for fid, fname in FRAME_IDS:
@@ -513,9 +681,8 @@ def stimulus(name="test"):
     print("\nCapturing baseline (20 readings)...")
     for _ in range(20):
         for fid, _ in FRAME_IDS:
-            d, ok = lin.recv(fid, tmo=40)
+            d, ok = lin.poll(lin.recv_nowait(fid))
             frames_before[fid].update(d if ok else None)
-            time.sleep_ms(2)
         time.sleep_ms(30)
 
     print("Baseline:")
@@ -523,7 +690,7 @@ def stimulus(name="test"):
         f = frames_before[fid]
         if f.data:
             print("  0x%02X: [%s]" % (
-                fid, " ".join("%02X" % b for b in f.data)))
+                fid, _hx(f.data)))
 
     print("\n>>> Apply stimulus: '%s' <<<" % name)
     print(">>> Press Enter when ready...")
@@ -536,9 +703,8 @@ def stimulus(name="test"):
     print("Capturing post-stimulus (20 readings)...")
     for _ in range(20):
         for fid, _ in FRAME_IDS:
-            d, ok = lin.recv(fid, tmo=40)
+            d, ok = lin.poll(lin.recv_nowait(fid))
             frames_after[fid].update(d if ok else None)
-            time.sleep_ms(2)
         time.sleep_ms(30)
 
     # Compare
@@ -550,10 +716,9 @@ def stimulus(name="test"):
             b = fb.data
             c = fa.data
             print("\n0x%02X (%s):" % (fid, fname))
-            print("  Before: [%s]" % " ".join("%02X" % v for v in b))
-            print("  After:  [%s]" % " ".join("%02X" % v for v in c))
-            diff = [i for i in range(min(len(b), len(c)))
-                    if b[i] != c[i]]
+            print("  Before: [%s]" % _hx(b))
+            print("  After:  [%s]" % _hx(c))
+            diff = [i for i, (x, y) in enumerate(zip(b, c)) if x != y]
             if diff:
                 print("  Changed bytes: %s" % diff)
                 for i in diff:
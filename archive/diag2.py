@@ -23,7 +23,12 @@ Usage:
 """
 
 import rp2
+import micropython
+from micropython import const
 from machine import Pin, UART
+from array import array
+import select
+import sys
 import time
 
 
@@ -58,9 +63,42 @@ def _pio_tx():
     wrap()
 
 
+def _find_byte(buf, target, start=0):
+    """Index of the first target byte in buf, or -1 (no bytes([p]) alloc)."""
+    i = start
+    n = len(buf)
+    while i < n:
+        if buf[i] == target:
+            return i
+        i += 1
+    return -1
+
+
+def _calc_pid(fid):
+    """Protected Identifier from 6-bit frame ID (builds _PID_TABLE)."""
+    b = [(fid >> i) & 1 for i in range(6)]
+    p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
+    p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
+    return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+
+
+# Branch-free end-around-carry fold; the RP2040 port always has viper
+@micropython.viper
+def _chk(data, pid: int) -> int:
+    s = pid
+    n = int(len(data))
+    i = 0
+    while i < n:
+        s += int(data[i])
+        s = (s & 0xFF) + (s >> 8)   # end-around carry, no branch
+        i += 1
+    return (~s) & 0xFF
+
+
 class LIN:
-    _BRK = 1 << 8
-    NAD = 0x02  # confirmed from diag_fuzzer
+    _BRK = const(1 << 8)
+    NAD = const(0x02)  # confirmed from diag_fuzzer
+    _PID_TABLE = bytes(_calc_pid(i) for i in range(64))
 
     def __init__(self, tx=0, rx=1, baud=19200):
         self.uart = UART(0, baudrate=baud, tx=Pin(12), rx=Pin(rx),
@@ -69,23 +107,20 @@ class LIN:
             0, _pio_tx, freq=baud * 8,
             out_base=Pin(tx), set_base=Pin(tx))
         self.sm.active(1)
+        self._poller = select.poll()
+        self._poller.register(self.uart, select.POLLIN)
+        # Reused for every received payload (see recv)
+        self._rx_scratch = bytearray(16)
+        self._rx_mv = memoryview(self._rx_scratch)
         print("LIN: TX=GPIO%d RX=GPIO%d %dbaud" % (tx, rx, baud))
 
     @staticmethod
     def pid(fid):
-        b = [(fid >> i) & 1 for i in range(6)]
-        p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
-        p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
-        return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+        return LIN._PID_TABLE[fid & 0x3F]
 
     @staticmethod
     def chk(data, pid=None):
-        s = pid if pid is not None else 0
-        for v in data:
-            s += v
-            if s > 255:
-                s -= 255
-        return (~s) & 0xFF
+        return _chk(data, pid if pid is not None else 0)
 
     def _brk(self):
         self.sm.put(self._BRK)
@@ -96,20 +131,22 @@ class LIN:
         time.sleep_us(200)
 
     def _flush(self):
-        while self.uart.any():
-            self.uart.read()
+        self.uart.read()            # drains everything pending, or None
 
     def _rx(self, n=11, tmo=50):
+        buf = bytearray(n)
+        mv = memoryview(buf)
+        off = 0
         t0 = time.ticks_ms()
-        buf = b""
-        while time.ticks_diff(time.ticks_ms(), t0) < tmo:
-            if self.uart.any():
-                c = self.uart.read()
-                if c:
-                    buf += c
-                if len(buf) >= n:
-                    break
-        return buf
+        while off < n:
+            # Block in C until bytes arrive or the time budget runs out
+            rem = tmo - time.ticks_diff(time.ticks_ms(), t0)
+            if rem <= 0 or not self._poller.poll(rem):
+                break
+            k = self.uart.readinto(mv[off:], n - off)
+            if k:
+                off += k
+        return bytes(mv[:off])
 
     def header(self, fid):
         p = self.pid(fid)
@@ -120,41 +157,57 @@ class LIN:
         return p
 
     def send(self, fid, data, enhanced=True):
-        p = self.header(fid)
+        p = self.pid(fid)
+        self.send_precomputed(p, data, self.chk(data, p if enhanced else None))
+
+    def send_precomputed(self, p, data, csum):
+        """send() for a fixed frame: PID and checksum computed once
+        by the caller (p = pid(fid), csum = chk(data, p))."""
+        # Whole frame goes to the PIO FIFO in one put; PIO paces the bytes
+        words = array("I", [self._BRK, 0x55 ^ 0xFF, p ^ 0xFF])
         for b in data:
-            self._tx(b)
-        self._tx(self.chk(data, p if enhanced else None))
+            words.append(b ^ 0xFF)
+        words.append(csum ^ 0xFF)
+        self._flush()
+        self.sm.put(words)
+        while self.sm.tx_fifo():
+            pass
         time.sleep_us(300)
 
     def recv(self, fid, tmo=50):
+        """Returns (data, ok). data is a view into a reused scratch
+        buffer, valid until the next recv/recv_raw; copy to keep it."""
         p = self.header(fid)
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None, False
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = _find_byte(raw, p)
+        if idx < 0:
             return None, False
         pay = raw[idx + 1:]
         if len(pay) < 2:
             return None, False
-        data = list(pay[:-1])
+        n = len(pay) - 1
+        self._rx_scratch[:n] = pay[:-1]
+        data = self._rx_mv[:n]
         return data, pay[-1] == self.chk(data, p)
 
     def recv_raw(self, fid, tmo=50):
-        """Receive with classic checksum (for 0x3D diagnostic responses)."""
+        """Receive with classic checksum (for 0x3D diagnostic responses).
+        Returns a scratch-buffer view like recv()."""
         p = self.header(fid)
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = _find_byte(raw, p)
+        if idx < 0:
             return None
         pay = raw[idx + 1:]
         if len(pay) < 2:
             return None
-        data = list(pay[:-1])
+        n = len(pay) - 1
+        self._rx_scratch[:n] = pay[:-1]
+        data = self._rx_mv[:n]
         if pay[-1] == self.chk(data):  # classic checksum
             return data
         return None
@@ -164,8 +217,24 @@ class LIN:
 # LIN Transport Protocol (multi-frame)
 # ================================================================
 
+# Progress lines from the sweeps are collected here and written in one
+# go per phase: each print() is a blocking USB-CDC write
+_LOG = []
+_log = _LOG.append
+
+
+def _flush_log():
+    if _LOG:
+        sys.stdout.write("\n".join(_LOG) + "\n")
+        _LOG.clear()
+
+
+# Two-digit hex for every byte value
+_HEX = tuple("%02X" % i for i in range(256))
+
+
 def _h(data):
-    return " ".join("%02X" % b for b in data)
+    return " ".join(_HEX[b] for b in data)
 
 
 def _diag_send(lin, payload):
@@ -193,9 +262,15 @@ def _send_fc(lin, nad, bs=0, stmin=0):
     _diag_send(lin, payload)
 
 
-def diag_request(lin, sid, data, nad=None):
+# Consecutive Frame wait (ms) and silent polls before giving up
+_CF_TMO = const(40)
+_CF_MISS_MAX = const(3)
+
+
+def diag_request(lin, sid, data, nad=None, tmo=100):
     """
     Send a diagnostic request and handle multi-frame response.
+    tmo bounds the wait for the first response frame (ms).
     Returns full response data bytes or None.
     """
     if nad is None:
@@ -206,7 +281,21 @@ def diag_request(lin, sid, data, nad=None):
     time.sleep_ms(15)
 
     # Read response
-    resp = _diag_recv(lin, tmo=100)
+    return _diag_response(lin, nad, _diag_recv(lin, tmo=tmo))
+
+
+def diag_request_raw(lin, frame, tmo=100):
+    """
+    Like diag_request(), but sends a prebuilt 8-byte frame
+    (NAD, PCI, SID, data, 0xFF pad) as is.
+    """
+    lin.send(0x3C, frame, enhanced=False)
+    time.sleep_ms(15)
+    return _diag_response(lin, frame[0], _diag_recv(lin, tmo=tmo))
+
+
+def _diag_response(lin, nad, resp):
+    """Unpack the first response frame, fetching CFs after a First Frame."""
     if not resp:
         return None
 
@@ -219,12 +308,16 @@ def diag_request(lin, sid, data, nad=None):
 
     # Single Frame (PCI type 0)
     if pci_type == 0:
-        return resp[2:2 + pci_len]
+        return bytes(resp[2:2 + pci_len])
 
     # First Frame (PCI type 1) — multi-frame response
     if pci_type == 1:
         total_len = ((resp[1] & 0x0F) << 8) | resp[2]
-        collected = resp[3:]  # first 5 data bytes from FF
+        # Reassemble in place: first 5 data bytes from FF, then CFs
+        out = bytearray(total_len)
+        mv = memoryview(out)
+        off = min(len(resp) - 3, total_len)
+        mv[:off] = resp[3:3 + off]
 
         # Send Flow Control
         time.sleep_ms(5)
@@ -232,15 +325,19 @@ def diag_request(lin, sid, data, nad=None):
         time.sleep_ms(10)
 
         # Read Consecutive Frames
+        # Once streaming, CFs follow closely: short waits, and give up
+        # after 3 consecutive silent polls instead of 20 full timeouts
         seq = 1
         retries = 0
-        while len(collected) < total_len and retries < 20:
-            cf = _diag_recv(lin, tmo=100)
+        miss = 0
+        while off < total_len and retries < 20 and miss < _CF_MISS_MAX:
+            cf = _diag_recv(lin, tmo=_CF_TMO)
             if not cf:
-                retries += 1
+                miss += 1
                 # Re-poll 0x3D
                 time.sleep_ms(10)
                 continue
+            miss = 0
 
             if cf[0] != nad:
                 retries += 1
@@ -255,12 +352,14 @@ def diag_request(lin, sid, data, nad=None):
                 continue
 
             # Consecutive Frame data: bytes 2-7
-            collected.extend(cf[2:])
+            chunk = min(len(cf) - 2, total_len - off)
+            mv[off:off + chunk] = cf[2:2 + chunk]
+            off += chunk
             seq += 1
             retries = 0
             time.sleep_ms(5)
 
-        return collected[:total_len]
+        return bytes(mv[:off])
 
     return None
 
@@ -277,30 +376,39 @@ def is_negative(resp):
     return resp[0] == 0x7F
 
 
+# NRCs too common to report (0x11/0x12 not supported, 0x31 out of
+# range) as a 256-bit set: test with _BORING_NRC[nrc >> 3] >> (nrc & 7) & 1
+_BORING_NRC = bytearray(32)
+for _n in (0x11, 0x12, 0x31):
+    _BORING_NRC[_n >> 3] |= 1 << (_n & 7)
+
+_NRC_NAMES = {
+    0x10: "generalReject",
+    0x11: "serviceNotSupported",
+    0x12: "subFunctionNotSupported",
+    0x13: "incorrectMessageLength",
+    0x14: "responseTooLong",
+    0x21: "busyRepeatRequest",
+    0x22: "conditionsNotCorrect",
+    0x24: "requestSequenceError",
+    0x25: "noResponseFromSubnet",
+    0x31: "requestOutOfRange",
+    0x33: "securityAccessDenied",
+    0x35: "invalidKey",
+    0x36: "exceededNumberOfAttempts",
+    0x37: "requiredTimeDelayNotExpired",
+    0x70: "uploadDownloadNotAccepted",
+    0x72: "generalProgrammingFailure",
+    0x73: "wrongBlockSequenceCounter",
+    0x78: "requestCorrectlyReceivedResponsePending",
+    0x7E: "subFunctionNotSupportedInActiveSession",
+    0x7F: "serviceNotSupportedInActiveSession",
+}
+
+
 def nrc_name(nrc):
-    names = {
-        0x10: "generalReject",
-        0x11: "serviceNotSupported",
-        0x12: "subFunctionNotSupported",
-        0x13: "incorrectMessageLength",
-        0x14: "responseTooLong",
-        0x21: "busyRepeatRequest",
-        0x22: "conditionsNotCorrect",
-        0x24: "requestSequenceError",
-        0x25: "noResponseFromSubnet",
-        0x31: "requestOutOfRange",
-        0x33: "securityAccessDenied",
-        0x35: "invalidKey",
-        0x36: "exceededNumberOfAttempts",
-        0x37: "requiredTimeDelayNotExpired",
-        0x70: "uploadDownloadNotAccepted",
-        0x72: "generalProgrammingFailure",
-        0x73: "wrongBlockSequenceCounter",
-        0x78: "requestCorrectlyReceivedResponsePending",
-        0x7E: "subFunctionNotSupportedInActiveSession",
-        0x7F: "serviceNotSupportedInActiveSession",
-    }
-    return names.get(nrc, "unknown_0x%02X" % nrc)
+    # Only format the fallback for unknown codes
+    return _NRC_NAMES.get(nrc) or "unknown_0x%02X" % nrc
 
 
 # ================================================================
@@ -352,90 +460,121 @@ def read_all():
     lin = _get_lin()
     results = {}
     print("Reading all local identifiers (0x00-0xFF)...")
+    # Full 100ms wait until the first reply shows the real turnaround;
+    # silent LIDs then only cost a few turnarounds each
+    tmo = 100
+    measured = False
     for lid in range(0x100):
-        resp = diag_request(lin, 0x21, [lid])
-        if resp and is_positive(resp, 0x21):
+        t0 = time.ticks_ms()
+        resp = diag_request(lin, 0x21, [lid], tmo=tmo)
+        if resp and not measured:
+            dt = time.ticks_diff(time.ticks_ms(), t0)
+            tmo = min(100, max(30, 3 * dt))
+            measured = True
+        r0 = resp[0] if resp else 0
+        if r0 == 0x61:
             data = resp[2:]
             results[lid] = data
             print("  LID 0x%02X (%2d bytes): [%s]" % (lid, len(data), _h(data)))
-        elif resp and is_negative(resp):
+        elif r0 == 0x7F:
             nrc = resp[2] if len(resp) > 2 else 0
-            if nrc not in (0x11, 0x12, 0x31):  # skip common "not supported"
+            if nrc == 0x11:  # service rejected outright: answers come fast
+                tmo = 20
+            if not _BORING_NRC[nrc >> 3] >> (nrc & 7) & 1:
                 print("  LID 0x%02X: NRC 0x%02X (%s)" % (lid, nrc, nrc_name(nrc)))
         time.sleep_ms(10)
 
-        if lid % 32 == 31:
-            print("  ... scanned 0x%02X" % lid)
+        if (lid & 31) == 31:
+            _log("  ... scanned 0x%02X" % lid)
 
+    _flush_log()
     print("\nFound %d readable local identifiers." % len(results))
     return results
 
 
+# KWP2000 / UDS SID table
+_SID_NAMES = {
+    0x10: "DiagnosticSessionControl",
+    0x11: "ECUReset",
+    0x14: "ClearDTC",
+    0x17: "ReadStatusOfDTC",
+    0x18: "ReadDTCByStatus",
+    0x19: "ReadDTCInformation",
+    0x1A: "ReadECUIdentification",
+    0x20: "StopDiagnosticSession",
+    0x21: "ReadDataByLocalIdentifier",
+    0x22: "ReadDataByIdentifier",
+    0x23: "ReadMemoryByAddress",
+    0x27: "SecurityAccess",
+    0x28: "CommunicationControl",
+    0x2E: "WriteDataByIdentifier",
+    0x2F: "InputOutputControlByIdentifier",
+    0x30: "InputOutputControlByLocalIdentifier",
+    0x31: "RoutineControl",
+    0x34: "RequestDownload",
+    0x35: "RequestUpload",
+    0x36: "TransferData",
+    0x37: "RequestTransferExit",
+    0x3B: "WriteDataByLocalIdentifier",
+    0x3D: "WriteMemoryByAddress",
+    0x3E: "TesterPresent",
+    0x85: "ControlDTCSetting",
+    0xB0: "AssignNAD",
+    0xB2: "ReadByIdentifier",
+    0xB5: "ConditionalChangeNAD",
+    0xB6: "SaveConfiguration",
+    0xB7: "AssignFrameIdRange",
+}
+
+
+def _sid_result(sid, resp, supported):
+    """Print and record the answer to one SID probe."""
+    if resp and is_positive(resp, sid):
+        name = _SID_NAMES.get(sid, "")
+        print("  SID 0x%02X: POSITIVE [%s] %s" % (sid, _h(resp), name))
+        supported.append((sid, "POSITIVE", resp))
+    elif resp and is_negative(resp):
+        nrc = resp[2] if len(resp) > 2 else 0
+        if nrc != 0x11:  # 0x11 = serviceNotSupported → skip
+            name = _SID_NAMES.get(sid, "")
+            print("  SID 0x%02X: NRC=0x%02X (%s) %s" % (
+                sid, nrc, nrc_name(nrc), name))
+            supported.append((sid, "NRC_0x%02X" % nrc, resp))
+
+
 def sids():
     """Find all supported SIDs by sending each with minimal data."""
     lin = _get_lin()
     supported = []
     print("Scanning all SIDs (0x00-0xFF)...")
 
-    # KWP2000 / UDS SID table
-    sid_names = {
-        0x10: "DiagnosticSessionControl",
-        0x11: "ECUReset",
-        0x14: "ClearDTC",
-        0x17: "ReadStatusOfDTC",
-        0x18: "ReadDTCByStatus",
-        0x19: "ReadDTCInformation",
-        0x1A: "ReadECUIdentification",
-        0x20: "StopDiagnosticSession",
-        0x21: "ReadDataByLocalIdentifier",
-        0x22: "ReadDataByIdentifier",
-        0x23: "ReadMemoryByAddress",
-        0x27: "SecurityAccess",
-        0x28: "CommunicationControl",
-        0x2E: "WriteDataByIdentifier",
-        0x2F: "InputOutputControlByIdentifier",
-        0x30: "InputOutputControlByLocalIdentifier",
-        0x31: "RoutineControl",
-        0x34: "RequestDownload",
-        0x35: "RequestUpload",
-        0x36: "TransferData",
-        0x37: "RequestTransferExit",
-        0x3B: "WriteDataByLocalIdentifier",
-        0x3D: "WriteMemoryByAddress",
-        0x3E: "TesterPresent",
-        0x85: "ControlDTCSetting",
-        0xB0: "AssignNAD",
-        0xB2: "ReadByIdentifier",
-        0xB5: "ConditionalChangeNAD",
-        0xB6: "SaveConfiguration",
-        0xB7: "AssignFrameIdRange",
-    }
-
     for sid in range(0x100):
         # Try with PCI=2 (SID + 1 data byte) which worked for 0x21
         resp = diag_request(lin, sid, [0x01])
-        tag = ""
-
-        if resp and is_positive(resp, sid):
-            name = sid_names.get(sid, "")
-            print("  SID 0x%02X: POSITIVE [%s] %s" % (sid, _h(resp), name))
-            supported.append((sid, "POSITIVE", resp))
-        elif resp and is_negative(resp):
-            nrc = resp[2] if len(resp) > 2 else 0
-            if nrc != 0x11:  # 0x11 = serviceNotSupported → skip
-                name = sid_names.get(sid, "")
-                print("  SID 0x%02X: NRC=0x%02X (%s) %s" % (
-                    sid, nrc, nrc_name(nrc), name))
-                supported.append((sid, "NRC_0x%02X" % nrc, resp))
+        _sid_result(sid, resp, supported)
 
         time.sleep_ms(10)
-        if sid % 32 == 31:
-            print("  ... scanned 0x%02X" % sid)
+        if (sid & 31) == 31:
+            _log("  ... scanned 0x%02X" % sid)
 
+    _flush_log()
     print("\nFound %d supported/known SIDs." % len(supported))
     return supported
 
 
+# Modified-byte patterns for the PHASE 5 write scan, and the matching
+# SID 0x3B request frames with the LID byte (index 3) left as 0x00
+_CODING_PATTERNS = (
+    b"\x01", b"\xFF", b"\x00",
+    b"\x01\x00", b"\x01\x01", b"\xFF\xFF",
+    b"\x03\x30\x4D",
+    b"\x07", b"\x0F", b"\x80", b"\x81",
+)
+_CODING_FRAMES = tuple(
+    (bytes((LIN.NAD, 2 + len(p), 0x3B, 0x00)) + p + b"\xFF" * 8)[:8]
+    for p in _CODING_PATTERNS)
+
+
 def write(lid, data, verbose=True):
     """Write local identifier via SID 0x3B (WriteDataByLocalIdentifier)."""
     lin = _get_lin()
@@ -533,14 +672,16 @@ def check_fir(lin=None, cmd_id=0x20, cycles=30):
     if lin is None:
         lin = _get_lin()
     pay = [0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x00, 0x00]
+    p = lin.pid(cmd_id)
+    csum = lin.chk(pay, p)
     for _ in range(cycles):
-        lin.send(cmd_id, pay)
+        lin.send_precomputed(p, pay, csum)
         time.sleep_ms(5)
         d, ok = lin.recv(0x30, tmo=40)
         if d and ok:
             b0, b1 = d[0], d[1]
             if b0 != 0 and b0 < 0xFE and b1 != 0 and b1 < 0xFE:
-                return True, d
+                return True, list(d)
         lin.recv(0x23, tmo=30)
         time.sleep_ms(10)
     return False, None
@@ -558,7 +699,11 @@ def run():
     print(" KWP2000 DIAGNOSTIC SCAN — 81A 955 555 A (NAD=0x02)")
     print("=" * 64)
 
-    findings = []
+    # One list per finding kind, so the summary never filters by tag
+    findings = {tag: [] for tag in (
+        "SID", "LID_READ", "ECU_ID", "SECURITY_SEED", "SECURITY_NRC",
+        "WRITE_ECHO_OK", "WRITE_OK", "FIR_ACTIVE", "IO_CTRL_OK",
+        "ROUTINE_OK")}
     fir_activated = False
 
     # ----------------------------------------------------------
@@ -567,7 +712,7 @@ def run():
     print("\nPHASE 1: SID discovery")
     sid_results = sids()
     for sid, status, resp in sid_results:
-        findings.append(("SID", sid, status, resp))
+        findings["SID"].append((sid, status, resp))
 
     # ----------------------------------------------------------
     # PHASE 2: Read all local identifiers
@@ -575,7 +720,7 @@ def run():
     print("\nPHASE 2: ReadDataByLocalIdentifier sweep")
     lid_data = read_all()
     for lid, data in lid_data.items():
-        findings.append(("LID_READ", lid, data))
+        findings["LID_READ"].append((lid, data))
 
     # ----------------------------------------------------------
     # PHASE 3: ReadECUIdentification sweep
@@ -583,117 +728,123 @@ def run():
     print("\nPHASE 3: ReadECUIdentification (SID 0x1A)")
     for sub in range(0x100):
         resp = diag_request(lin, 0x1A, [sub])
-        if resp and is_positive(resp, 0x1A):
+        r0 = resp[0] if resp else 0
+        if r0 == 0x5A:
             print("  ECU_ID sub=0x%02X: [%s]" % (sub, _h(resp)))
-            findings.append(("ECU_ID", sub, resp))
-        elif resp and is_negative(resp):
+            findings["ECU_ID"].append((sub, resp))
+        elif r0 == 0x7F:
             nrc = resp[2] if len(resp) > 2 else 0
-            if nrc not in (0x11, 0x12, 0x31):
+            if not _BORING_NRC[nrc >> 3] >> (nrc & 7) & 1:
                 print("  ECU_ID sub=0x%02X: NRC=0x%02X" % (sub, nrc))
         time.sleep_ms(10)
-        if sub % 64 == 63:
-            print("  ... scanned 0x%02X" % sub)
+        if (sub & 63) == 63:
+            _log("  ... scanned 0x%02X" % sub)
 
     # ----------------------------------------------------------
     # PHASE 4: SecurityAccess
     # ----------------------------------------------------------
+    _flush_log()
     print("\nPHASE 4: SecurityAccess (SID 0x27)")
     for level in range(0x01, 0x42, 2):  # odd levels = request seed
         resp = diag_request(lin, 0x27, [level])
-        if resp and is_positive(resp, 0x27):
+        r0 = resp[0] if resp else 0
+        if r0 == 0x67:
             print("  SEED level=0x%02X: [%s]" % (level, _h(resp)))
-            findings.append(("SECURITY_SEED", level, resp))
-        elif resp and is_negative(resp):
+            findings["SECURITY_SEED"].append((level, resp))
+        elif r0 == 0x7F:
             nrc = resp[2] if len(resp) > 2 else 0
-            if nrc not in (0x11, 0x12, 0x31):
+            if not _BORING_NRC[nrc >> 3] >> (nrc & 7) & 1:
                 print("  SEC level=0x%02X: NRC=0x%02X (%s)" % (
                     level, nrc, nrc_name(nrc)))
-                findings.append(("SECURITY_NRC", level, nrc))
+                findings["SECURITY_NRC"].append((level, nrc))
         time.sleep_ms(10)
 
     # ----------------------------------------------------------
     # PHASE 5: WriteDataByLocalIdentifier on readable LIDs
     # ----------------------------------------------------------
+    _flush_log()
     print("\nPHASE 5: WriteDataByLocalIdentifier (SID 0x3B)")
 
     # First try writing back the same data we read (echo test)
     for lid, orig_data in lid_data.items():
         ok = write(lid, orig_data, verbose=True)
         if ok:
-            findings.append(("WRITE_ECHO_OK", lid, orig_data))
+            findings["WRITE_ECHO_OK"].append((lid, orig_data))
             # Check FIR
             active, rd = check_fir(lin)
             if active:
                 print("  *** FIR ACTIVATED after writing LID 0x%02X! ***" % lid)
-                findings.append(("FIR_ACTIVE", lid, orig_data, rd))
+                findings["FIR_ACTIVE"].append((lid, orig_data, rd))
                 fir_activated = True
         time.sleep_ms(10)
 
-    # Try writing with modified bytes
-    coding_patterns = [
-        [0x01], [0xFF], [0x00],
-        [0x01, 0x00], [0x01, 0x01], [0xFF, 0xFF],
-        [0x03, 0x30, 0x4D],
-        [0x07], [0x0F], [0x80], [0x81],
-    ]
-
+    # Try writing with modified bytes; only the LID byte changes per frame
+    frame = bytearray(8)
     for lid in range(0x100):
-        for pat in coding_patterns:
-            ok = write(lid, pat, verbose=False)
-            if ok:
+        echoed = lid_data.get(lid)
+        for pat, tmpl in zip(_CODING_PATTERNS, _CODING_FRAMES):
+            if pat == echoed:
+                continue  # already written by the echo test above
+            frame[:] = tmpl
+            frame[3] = lid
+            resp = diag_request_raw(lin, frame)
+            if resp and resp[0] == 0x7B:
                 print("  WRITE OK! LID=0x%02X data=[%s]" % (lid, _h(pat)))
-                findings.append(("WRITE_OK", lid, pat))
+                findings["WRITE_OK"].append((lid, pat))
                 # Check FIR
                 active, rd = check_fir(lin, cycles=20)
                 if active:
                     print("  *** FIR ACTIVATED! LID=0x%02X data=[%s] ***" % (
                         lid, _h(pat)))
-                    findings.append(("FIR_ACTIVE", lid, pat, rd))
+                    findings["FIR_ACTIVE"].append((lid, pat, rd))
                     fir_activated = True
             time.sleep_ms(5)
-        if lid % 32 == 31:
-            print("  ... write-scan 0x%02X" % lid)
+        if (lid & 31) == 31:
+            _log("  ... write-scan 0x%02X" % lid)
 
     # ----------------------------------------------------------
     # PHASE 6: InputOutputControlByLocalIdentifier
     # ----------------------------------------------------------
+    _flush_log()
     print("\nPHASE 6: InputOutputControl (SID 0x30)")
     # Control params: 0x00=returnControlToECU, 0x01=reportCurrentState,
     # 0x04=resetToDefault, 0x07=shortTermAdjustment, 0x08=freezeCurrentState
     for lid in range(0x100):
         for ctrl in (0x00, 0x01, 0x04, 0x07, 0x08):
             resp = diag_request(lin, 0x30, [lid, ctrl])
-            if resp and is_positive(resp, 0x30):
+            if resp and resp[0] == 0x70:
                 print("  IO_CTRL LID=0x%02X ctrl=0x%02X: [%s]" % (
                     lid, ctrl, _h(resp)))
-                findings.append(("IO_CTRL_OK", lid, ctrl, resp))
+                findings["IO_CTRL_OK"].append((lid, ctrl, resp))
                 # Check FIR
                 active, rd = check_fir(lin, cycles=15)
                 if active:
                     print("  *** FIR via IO_CTRL! LID=0x%02X ***" % lid)
                     fir_activated = True
             time.sleep_ms(5)
-        if lid % 64 == 63:
-            print("  ... io-scan 0x%02X" % lid)
+        if (lid & 63) == 63:
+            _log("  ... io-scan 0x%02X" % lid)
 
     # ----------------------------------------------------------
     # PHASE 7: RoutineControl
     # ----------------------------------------------------------
+    _flush_log()
     print("\nPHASE 7: RoutineControl (SID 0x31)")
     for rid in range(0x100):
         for sub in (0x01, 0x02, 0x03):  # start, stop, requestResults
             resp = diag_request(lin, 0x31, [sub, 0x00, rid])
-            if resp and is_positive(resp, 0x31):
+            if resp and resp[0] == 0x71:
                 print("  ROUTINE RID=0x%04X sub=0x%02X: [%s]" % (
                     rid, sub, _h(resp)))
-                findings.append(("ROUTINE_OK", rid, sub, resp))
+                findings["ROUTINE_OK"].append((rid, sub, resp))
             time.sleep_ms(5)
-        if rid % 64 == 63:
-            print("  ... routine-scan 0x%02X" % rid)
+        if (rid & 63) == 63:
+            _log("  ... routine-scan 0x%02X" % rid)
 
     # ----------------------------------------------------------
     # SUMMARY
     # ----------------------------------------------------------
+    _flush_log()
     print("\n" + "=" * 64)
     print(" SCAN COMPLETE")
     print("=" * 64)
@@ -701,26 +852,23 @@ def run():
     if fir_activated:
         print("\n *** FIR RAIN DETECTION ACTIVATED! ***")
 
-    pos_findings = [f for f in findings if "OK" in f[0] or "ACTIVE" in f[0]
-                    or "SEED" in f[0] or "LID_READ" in f[0] or "ECU_ID" in f[0]]
-    print("\nKey findings (%d):" % len(pos_findings))
-    for f in pos_findings:
-        tag = f[0]
-        if tag == "LID_READ":
-            lid, data = f[1], f[2]
-            print("  READ  LID=0x%02X: [%s]" % (lid, _h(data)))
-        elif tag == "ECU_ID":
-            sub, resp = f[1], f[2]
-            print("  ECUID sub=0x%02X: [%s]" % (sub, _h(resp)))
-        elif "FIR" in tag:
-            print("  >>> %s: %s" % (tag, str(f[1:])))
-        else:
-            print("  %s: %s" % (tag, str(f[1:])))
+    other_tags = ("SECURITY_SEED", "WRITE_ECHO_OK", "WRITE_OK",
+                  "FIR_ACTIVE", "IO_CTRL_OK", "ROUTINE_OK")
+    n_key = (len(findings["LID_READ"]) + len(findings["ECU_ID"]) +
+             sum(len(findings[tag]) for tag in other_tags))
+    print("\nKey findings (%d):" % n_key)
+    for lid, data in findings["LID_READ"]:
+        print("  READ  LID=0x%02X: [%s]" % (lid, _h(data)))
+    for sub, resp in findings["ECU_ID"]:
+        print("  ECUID sub=0x%02X: [%s]" % (sub, _h(resp)))
+    for tag in other_tags:
+        fmt = "  >>> %s: %s" if tag == "FIR_ACTIVE" else "  %s: %s"
+        for f in findings[tag]:
+            print(fmt % (tag, str(f)))
 
     print("\nSIDs with non-0x11 responses:")
-    for f in findings:
-        if f[0] == "SID":
-            print("  SID 0x%02X: %s" % (f[1], f[2]))
+    for sid, status, resp in findings["SID"]:
+        print("  SID 0x%02X: %s" % (sid, status))
 
     print("=" * 64)
     return findings
@@ -22,7 +22,11 @@ Usage:
 """
 
 import rp2
+from micropython import const
 from machine import Pin, UART
+from array import array
+from binascii import hexlify
+import select
 import time
 
 
@@ -57,9 +61,23 @@ def _pio_tx():
     wrap()
 
 
+# PIO0 SM0 TX FIFO register and its DMA request line (RP2040 datasheet)
+_PIO0_TXF0 = const(0x50200010)
+_DREQ_PIO0_TX0 = const(0)
+
+
+def _calc_pid(fid):
+    """Protected Identifier from 6-bit frame ID (builds _PID_TABLE)."""
+    b = [(fid >> i) & 1 for i in range(6)]
+    p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
+    p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
+    return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+
+
 class LIN:
-    _BRK = 1 << 8
-    NAD = 0x02
+    _BRK = const(1 << 8)
+    NAD = const(0x02)
+    _PID_TABLE = bytes(_calc_pid(i) for i in range(64))
 
     def __init__(self, tx=0, rx=1, baud=19200):
         self.uart = UART(0, baudrate=baud, tx=Pin(12), rx=Pin(rx),
@@ -68,22 +86,30 @@ class LIN:
             0, _pio_tx, freq=baud * 8,
             out_base=Pin(tx), set_base=Pin(tx))
         self.sm.active(1)
+        # Master frames are DMA'd into the PIO FIFO as one word per byte
+        self._tx_words = array("I", [0] * 12)
+        self._dma = rp2.DMA()
+        self._dma_ctrl = self._dma.pack_ctrl(
+            size=2, inc_read=True, inc_write=False, treq_sel=_DREQ_PIO0_TX0)
+        # Scratch 0x3C frame, reused by _send_diag()
+        self._tx_buf = bytearray(8)
+        self._poller = select.poll()
+        self._poller.register(self.uart, select.POLLIN)
+        # RX lands here via readinto(); _rx() copies out only what arrived
+        self._rx_buf = bytearray(16)
+        self._rx_mv = memoryview(self._rx_buf)
         print("LIN: TX=GPIO%d RX=GPIO%d %dbaud" % (tx, rx, baud))
 
     @staticmethod
     def pid(fid):
-        b = [(fid >> i) & 1 for i in range(6)]
-        p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
-        p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
-        return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+        return LIN._PID_TABLE[fid & 0x3F]
 
     @staticmethod
     def chk(data, pid=None):
-        s = pid if pid is not None else 0
-        for v in data:
-            s += v
-            if s > 255:
-                s -= 255
+        s = sum(data) + (pid if pid is not None else 0)
+        # End-around carry, same as subtracting 255 on each overflow
+        s = (s & 0xFF) + (s >> 8)
+        s = (s & 0xFF) + (s >> 8)
         return (~s) & 0xFF
 
     def _brk(self):
@@ -95,20 +121,26 @@ class LIN:
         time.sleep_us(200)
 
     def _flush(self):
-        while self.uart.any():
-            self.uart.read()
+        self.uart.read()            # drains everything pending, or None
 
     def _rx(self, n=11, tmo=50):
-        t0 = time.ticks_ms()
-        buf = b""
-        while time.ticks_diff(time.ticks_ms(), t0) < tmo:
-            if self.uart.any():
-                c = self.uart.read()
-                if c:
-                    buf += c
-                if len(buf) >= n:
-                    break
-        return buf
+        mv = self._rx_mv
+        n = min(n, len(mv))
+        ticks_ms = time.ticks_ms
+        ticks_diff = time.ticks_diff
+        wait = self._poller.poll
+        readinto = self.uart.readinto
+        off = 0
+        t0 = ticks_ms()
+        while off < n:
+            # Block in C until bytes arrive or the time budget runs out
+            rem = tmo - ticks_diff(ticks_ms(), t0)
+            if rem <= 0 or not wait(rem):
+                break
+            k = readinto(mv[off:], n - off)
+            if k:
+                off += k
+        return bytes(mv[:off])
 
     def header(self, fid):
         p = self.pid(fid)
@@ -119,10 +151,30 @@ class LIN:
         return p
 
     def send(self, fid, data, enhanced=True):
-        p = self.header(fid)
+        p = self.pid(fid)
+        w = self._tx_words
+        w[0] = self._BRK
+        w[1] = 0x55 ^ 0xFF
+        w[2] = p ^ 0xFF
+        # Checksum accumulates in the same pass that fills the words
+        s = p if enhanced else 0
+        i = 3
         for b in data:
-            self._tx(b)
-        self._tx(self.chk(data, p if enhanced else None))
+            w[i] = b ^ 0xFF
+            s += b
+            i += 1
+        s = (s & 0xFF) + (s >> 8)
+        s = (s & 0xFF) + (s >> 8)
+        w[i] = s  # ~s ^ 0xFF == s: the inverted checksum cancels out
+        self._flush()
+        # PIO paces the bytes; wait until DMA and FIFO have drained
+        dma = self._dma
+        dma.config(read=w, write=_PIO0_TXF0, count=i + 1,
+                   ctrl=self._dma_ctrl, trigger=True)
+        while dma.active():
+            pass
+        while self.sm.tx_fifo():
+            pass
         time.sleep_us(300)
 
     def recv(self, fid, tmo=50):
@@ -137,7 +189,7 @@ class LIN:
         pay = raw[idx + 1:]
         if len(pay) < 2:
             return None, False
-        data = list(pay[:-1])
+        data = pay[:-1]
         return data, pay[-1] == self.chk(data, p)
 
 
@@ -146,14 +198,20 @@ class LIN:
 # ================================================================
 
 def _h(data):
-    return " ".join("%02X" % b for b in data)
+    # One C call instead of a per-byte format/join
+    return hexlify(bytes(data), " ").decode().upper()
+
+
+_PAD = b"\xFF" * 8
 
 
 def _send_diag(lin, payload):
     """Send 8-byte frame on 0x3C with classic checksum."""
-    while len(payload) < 8:
-        payload.append(0xFF)
-    lin.send(0x3C, payload[:8], enhanced=False)
+    buf = lin._tx_buf
+    n = min(len(payload), 8)
+    buf[:n] = bytes(payload[:n])
+    buf[n:] = _PAD[:8 - n]
+    lin.send(0x3C, buf, enhanced=False)
 
 
 def _recv_diag(lin, tmo=100):
@@ -169,7 +227,7 @@ def _recv_diag(lin, tmo=100):
     pay = raw[idx + 1:]
     if len(pay) < 2:
         return None
-    data = list(pay[:-1])
+    data = pay[:-1]
     if pay[-1] == lin.chk(data):  # classic checksum
         return data
     return None
@@ -188,7 +246,7 @@ def _recv_diag_raw(lin, tmo=100):
     pay = raw[idx + 1:]
     if len(pay) < 1:
         return None
-    return list(pay)
+    return pay
 
 
 # ================================================================
@@ -210,7 +268,11 @@ def diag_request(lin, sid, data, nad=None):
     time.sleep_ms(15)
 
     # Read response
-    resp = _recv_diag(lin, tmo=100)
+    return _diag_response(lin, nad, _recv_diag(lin, tmo=100))
+
+
+def _diag_response(lin, nad, resp):
+    """Unpack a 0x3D response frame; fetches CFs if it is a First Frame."""
     if not resp:
         return None
 
@@ -227,7 +289,7 @@ def diag_request(lin, sid, data, nad=None):
     # First Frame (PCI type 1) — multi-frame
     if pci_type == 1:
         total_len = ((resp[1] & 0x0F) << 8) | resp[2]
-        collected = list(resp[3:])  # up to 5 data bytes from FF
+        collected = bytearray(resp[3:])  # up to 5 data bytes from FF
 
         # Send Flow Control
         time.sleep_ms(2)
@@ -264,11 +326,92 @@ def diag_request(lin, sid, data, nad=None):
             retries = 0
             time.sleep_ms(2)
 
-        return collected[:total_len]
+        return bytes(collected[:total_len])
 
     return None
 
 
+def diag_request_raw(lin, req):
+    """
+    Send a prebuilt 8-byte request frame (NAD, PCI, SID, data, 0xFF pad)
+    and unpack the response like diag_request(). Scans patch one scratch
+    bytearray in place instead of building lists per DID.
+    """
+    lin.send(0x3C, req, enhanced=False)
+    time.sleep_ms(15)
+    return _diag_response(lin, req[0], _recv_diag(lin, tmo=100))
+
+
+def diag_request_pipelined(lin, frames, gap_ms=15, idle_ms=5):
+    """
+    Send prebuilt 8-byte request frames back to back and yield each
+    response as diag_request_raw() would. A frame is on the wire before
+    the next one is fetched, so the source may refill one bytearray.
+
+    LIN allows one outstanding request per slave, so this cannot queue
+    frames; instead the fixed sleeps become deadlines. The next frame
+    is fetched while the slave is still processing, and the caller's
+    handling of a response counts towards the idle gap.
+    """
+    ticks_ms = time.ticks_ms
+    ticks_diff = time.ticks_diff
+    sleep_ms = time.sleep_ms
+    send = lin.send
+    it = iter(frames)
+    req = next(it, None)
+    t_idle = ticks_ms()
+    while req is not None:
+        nad = req[0]
+        d = idle_ms - ticks_diff(ticks_ms(), t_idle)
+        if d > 0:
+            sleep_ms(d)
+        send(0x3C, req, enhanced=False)
+        t_sent = ticks_ms()
+        req = next(it, None)
+        d = gap_ms - ticks_diff(ticks_ms(), t_sent)
+        if d > 0:
+            sleep_ms(d)
+        resp = _diag_response(lin, nad, _recv_diag(lin, tmo=100))
+        t_idle = ticks_ms()
+        yield resp
+
+
+def _did_frames(req, start, end, step=1):
+    """Patch the DID into req[3:5] for each DID in range, yielding req."""
+    for did in range(start, end + 1, step):
+        req[3] = did >> 8
+        req[4] = did & 0xFF
+        yield req
+
+
+class DiagTemplate:
+    """
+    Request frame with NAD, PCI and SID fixed for a whole scan. data
+    gives the initial bytes after the SID (and so the PCI); each send
+    only patches what changes.
+    """
+
+    def __init__(self, lin, sid, data):
+        self.lin = lin
+        self.buf = bytearray(_PAD)
+        self.buf[0] = lin.NAD
+        self.buf[1] = 1 + len(data)
+        self.buf[2] = sid
+        self.buf[3:3 + len(data)] = bytes(data)
+
+    def send(self, data):
+        """Overwrite the bytes after the SID with data and send."""
+        self.buf[3:3 + len(data)] = data
+        return diag_request_raw(self.lin, self.buf)
+
+    def send_did(self, did):
+        """Overwrite the 2-byte DID after the SID and send."""
+        buf = self.buf
+        buf[3] = did >> 8
+        buf[4] = did & 0xFF
+        return diag_request_raw(self.lin, buf)
+
+
 def diag_raw(lin, payload_8, tmo=100):
     """Send raw 8 bytes on 0x3C, read raw response from 0x3D."""
     _send_diag(lin, list(payload_8))
@@ -291,6 +434,9 @@ NRC_NAMES = {
     0x7E: "subFuncNotSupportedInSession", 0x7F: "serviceNotSupportedInSession",
 }
 
+# Indexed by the raw NRC byte, so printing never probes the dict
+_NRC_TBL = tuple(NRC_NAMES.get(i, "?") for i in range(256))
+
 _lin = None
 
 
@@ -310,15 +456,18 @@ def check_fir(lin=None, cmd_id=0x20, cycles=30):
     if lin is None:
         lin = _get_lin()
     pay = [0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x00, 0x00]
+    send = lin.send
+    recv = lin.recv
+    sleep_ms = time.sleep_ms
     for _ in range(cycles):
-        lin.send(cmd_id, pay)
-        time.sleep_ms(5)
-        d, ok = lin.recv(0x30, tmo=40)
+        send(cmd_id, pay)
+        sleep_ms(5)
+        d, ok = recv(0x30, tmo=40)
         if d and ok:
             if d[0] != 0 and d[0] < 0xFE and d[1] != 0 and d[1] < 0xFE:
                 return True, d
-        lin.recv(0x23, tmo=30)
-        time.sleep_ms(10)
+        recv(0x23, tmo=30)
+        sleep_ms(10)
     return False, None
 
 
@@ -442,7 +591,7 @@ def read22(did, verbose=True):
         nrc = resp[2]
         if verbose:
             print("DID 0x%04X: NRC 0x%02X (%s)" % (
-                did, nrc, NRC_NAMES.get(nrc, "?")))
+                did, nrc, _NRC_TBL[nrc]))
         return None
     else:
         if verbose and resp:
@@ -450,6 +599,22 @@ def read22(did, verbose=True):
         return None
 
 
+def _scan22_hit(did, resp, hits):
+    """Report one scan22 response; records hits and interesting NRCs."""
+    if resp and len(resp) >= 1:
+        if resp[0] == 0x62:  # positive
+            data = resp[3:] if len(resp) > 3 else resp[1:]
+            print("  HIT DID 0x%04X: [%s]" % (did, _h(data)))
+            hits[did] = data
+        elif resp[0] == 0x7F and len(resp) >= 3:
+            nrc = resp[2]
+            # Log interesting NRCs (not 0x31=outOfRange, 0x11=notSupported)
+            if nrc not in (0x31, 0x11, 0x12):
+                print("  DID 0x%04X: NRC 0x%02X (%s)" % (
+                    did, nrc, _NRC_TBL[nrc]))
+                hits[did] = ("NRC", nrc)
+
+
 def scan22(start=0x0000, end=0xFFFF, step=1):
     """Sweep SID 0x22 across DID range. Only prints hits."""
     lin = _get_lin()
@@ -460,42 +625,37 @@ def scan22(start=0x0000, end=0xFFFF, step=1):
     print("Scanning SID 0x22 DIDs 0x%04X-0x%04X (%d DIDs)..." % (
         start, end, total))
 
+    t = DiagTemplate(lin, 0x22, b"\x00\x00")
     did = start
-    while did <= end:
-        dh = (did >> 8) & 0xFF
-        dl = did & 0xFF
-        resp = diag_request(lin, 0x22, [dh, dl])
-
-        if resp and len(resp) >= 1:
-            if resp[0] == 0x62:  # positive
-                data = resp[3:] if len(resp) > 3 else resp[1:]
-                print("  HIT DID 0x%04X: [%s]" % (did, _h(data)))
-                hits[did] = data
-            elif resp[0] == 0x7F and len(resp) >= 3:
-                nrc = resp[2]
-                # Log interesting NRCs (not 0x31=outOfRange, 0x11=notSupported)
-                if nrc not in (0x31, 0x11, 0x12):
-                    print("  DID 0x%04X: NRC 0x%02X (%s)" % (
-                        did, nrc, NRC_NAMES.get(nrc, "?")))
-                    hits[did] = ("NRC", nrc)
-
+    frames = _did_frames(t.buf, start, end, step)
+    for resp in diag_request_pipelined(lin, frames):
+        _scan22_hit(did, resp, hits)
         count += 1
-        if count % 256 == 0:
+        if not count & 0xFF:
             print("  ... %d/%d (0x%04X)" % (count, total, did))
-        time.sleep_ms(5)
         did += step
 
     print("Done. %d hits." % len(hits))
     return hits
 
 
+# Range probe: give up on a range when nearly all of its first DIDs
+# get no answer or NRC 0x11 (service not supported at all)
+_PROBE_N = const(16)
+_PROBE_DEAD = const(15)
+
+
+def _is_dead(resp):
+    return not resp or (resp[0] == 0x7F and len(resp) >= 3 and resp[2] == 0x11)
+
+
 def scan22_fast():
     """Quick scan of common VAG DID ranges."""
     lin = _get_lin()
     hits = {}
 
     # VAG-typical DID ranges
-    ranges = [
+    ranges = (
         (0x0100, 0x01FF, "identification"),
         (0x0200, 0x02FF, "coding"),
         (0x0300, 0x03FF, "coding2"),
@@ -508,16 +668,19 @@ def scan22_fast():
         (0x2000, 0x20FF, "IoControl"),
         (0xFD00, 0xFDFF, "VW_special"),
         (0xFE00, 0xFEFF, "VW_special2"),
-    ]
+    )
 
+    sleep_ms = time.sleep_ms
+    t = DiagTemplate(lin, 0x22, b"\x00\x00")
     for start, end, name in ranges:
         print("\nRange 0x%04X-0x%04X (%s):" % (start, end, name))
         found = 0
+        dead = 0
         for did in range(start, end + 1):
-            dh = (did >> 8) & 0xFF
-            dl = did & 0xFF
-            resp = diag_request(lin, 0x22, [dh, dl])
-            if resp and len(resp) >= 1:
+            resp = t.send_did(did)
+            if _is_dead(resp):
+                dead += 1
+            elif len(resp) >= 1:
                 if resp[0] == 0x62:
                     data = resp[3:] if len(resp) > 3 else resp[1:]
                     print("  HIT 0x%04X: [%s]" % (did, _h(data)))
@@ -527,12 +690,16 @@ def scan22_fast():
                     nrc = resp[2]
                     if nrc not in (0x31, 0x11, 0x12, 0x13):
                         print("  NRC 0x%04X: 0x%02X (%s)" % (
-                            did, nrc, NRC_NAMES.get(nrc, "?")))
+                            did, nrc, _NRC_TBL[nrc]))
                         hits[did] = ("NRC", nrc)
                         found += 1
-            time.sleep_ms(5)
-        if found == 0:
-            print("  (none)")
+            sleep_ms(5)
+            if did - start == _PROBE_N - 1 and dead >= _PROBE_DEAD:
+                print("  (dead, skipped after %d DIDs)" % _PROBE_N)
+                break
+        else:
+            if found == 0:
+                print("  (none)")
 
     print("\nTotal hits: %d" % len(hits))
     return hits
@@ -558,7 +725,7 @@ def write2e(did, data, verbose=True):
         nrc = resp[2]
         if verbose:
             print("WRITE FAIL DID 0x%04X: NRC 0x%02X (%s)" % (
-                did, nrc, NRC_NAMES.get(nrc, "?")))
+                did, nrc, _NRC_TBL[nrc]))
         return False
     else:
         if verbose:
@@ -579,12 +746,12 @@ def scan2e(start=0x0000, end=0xFFFF, step=1):
 
     print("Scanning SID 0x2E writable DIDs 0x%04X-0x%04X..." % (start, end))
 
+    sleep_ms = time.sleep_ms
+    # DID, then a single data byte 0x00
+    t = DiagTemplate(lin, 0x2E, b"\x00\x00\x00")
     did = start
     while did <= end:
-        dh = (did >> 8) & 0xFF
-        dl = did & 0xFF
-        # Try writing single byte 0x00
-        resp = diag_request(lin, 0x2E, [dh, dl, 0x00])
+        resp = t.send_did(did)
 
         if resp and len(resp) >= 1:
             if resp[0] == 0x6E:  # positive
@@ -612,13 +779,13 @@ def scan2e(start=0x0000, end=0xFFFF, step=1):
                     hits[did] = ("PROG_FAIL", nrc)
                 elif nrc not in (0x11, 0x12):
                     print("  DID 0x%04X: NRC 0x%02X (%s)" % (
-                        did, nrc, NRC_NAMES.get(nrc, "?")))
+                        did, nrc, _NRC_TBL[nrc]))
                     hits[did] = ("NRC", nrc)
 
         count += 1
-        if count % 256 == 0:
+        if not count & 0xFF:
             print("  ... %d/%d (0x%04X)" % (count, total, did))
-        time.sleep_ms(5)
+        sleep_ms(5)
         did += step
 
     print("Done. %d interesting DIDs." % len(hits))
@@ -630,7 +797,7 @@ def scan2e_fast():
     lin = _get_lin()
     hits = {}
 
-    ranges = [
+    ranges = (
         (0x0100, 0x01FF, "identification"),
         (0x0200, 0x02FF, "coding"),
         (0x0300, 0x03FF, "coding2"),
@@ -641,7 +808,7 @@ def scan2e_fast():
         (0xF000, 0xF0FF, "UDS_config"),
         (0xFD00, 0xFDFF, "VW_special"),
         (0xFE00, 0xFEFF, "VW_special2"),
-    ]
+    )
 
     data_patterns = [
         [0x00],
@@ -651,14 +818,21 @@ def scan2e_fast():
         [0x01, 0x00, 0x00],
     ]
 
+    # One frame per data length: DID placeholder, then the pattern
+    templates = [DiagTemplate(lin, 0x2E, b"\x00\x00" + bytes(pat))
+                 for pat in data_patterns]
+
+    sleep_ms = time.sleep_ms
     for start, end, name in ranges:
         print("\nRange 0x%04X-0x%04X (%s):" % (start, end, name))
         found = 0
+        dead = 0
         for did in range(start, end + 1):
-            dh = (did >> 8) & 0xFF
-            dl = did & 0xFF
-            for pat in data_patterns:
-                resp = diag_request(lin, 0x2E, [dh, dl] + pat)
+            live = False
+            for pat, t in zip(data_patterns, templates):
+                resp = t.send_did(did)
+                if not _is_dead(resp):
+                    live = True
                 if resp and len(resp) >= 1:
                     if resp[0] == 0x6E:
                         print("  WRITE OK! DID 0x%04X data=[%s]" % (
@@ -679,11 +853,16 @@ def scan2e_fast():
                             elif nrc == 0x13:
                                 continue  # keep trying lengths
                             print("  DID 0x%04X: NRC 0x%02X (%s) data=[%s]" % (
-                                did, nrc, NRC_NAMES.get(nrc, "?"), _h(pat)))
+                                did, nrc, _NRC_TBL[nrc], _h(pat)))
                             hits[did] = ("NRC", nrc, pat)
                             found += 1
                             break
-                time.sleep_ms(3)
+                sleep_ms(3)
+            if not live:
+                dead += 1
+            if did - start == _PROBE_N - 1 and dead >= _PROBE_DEAD:
+                print("  (dead, skipped after %d DIDs)" % _PROBE_N)
+                break
         if found == 0 and (start & 0xFF00) not in (0x0100, 0x0600):
             pass  # quiet for less interesting ranges
 
@@ -704,6 +883,7 @@ def run():
     print("=" * 64)
 
     findings = []
+    sleep_ms = time.sleep_ms
 
     # ----------------------------------------------------------
     # PHASE 1: Debug multi-frame on SID 0x21
@@ -772,7 +952,7 @@ def run():
                     if active:
                         print("    *** FIR ACTIVATED! ***")
                         findings.append(("FIR_ACTIVE", did, val, rd))
-                time.sleep_ms(5)
+                sleep_ms(5)
 
     # ----------------------------------------------------------
     # PHASE 5: Try different SID 0x2E framing on known-good NAD
@@ -782,7 +962,7 @@ def run():
         print("\nPHASE 5: Alternative 0x2E framing attempts")
         nad = lin.NAD
         # Try various PCI values with DID 0x0330 (common VAG coding DID)
-        test_dids = [0x0330, 0x0600, 0x0100, 0x0200, 0xF198, 0xF199]
+        test_dids = array("H", (0x0330, 0x0600, 0x0100, 0x0200, 0xF198, 0xF199))
         for did in test_dids:
             dh = (did >> 8) & 0xFF
             dl = did & 0xFF
@@ -792,7 +972,7 @@ def run():
                     # Manually construct frame with explicit PCI
                     payload = [nad, pci, 0x2E] + data_field
                     _send_diag(lin, payload)
-                    time.sleep_ms(15)
+                    sleep_ms(15)
                     resp = _recv_diag(lin, tmo=100)
                     if resp and resp[0] == nad:
                         inner = resp[2:]
@@ -808,7 +988,7 @@ def run():
                             if nrc not in (0x31, 0x11, 0x12, 0x13):
                                 print("  DID=0x%04X PCI=%d NRC=0x%02X" % (
                                     did, pci, nrc))
-                    time.sleep_ms(3)
+                    sleep_ms(3)
 
     # ----------------------------------------------------------
     # SUMMARY
@@ -26,7 +26,10 @@ Usage:
 """
 
 import rp2
+import micropython
 from machine import Pin, UART
+from array import array
+import select
 import time
 
 
@@ -61,9 +64,45 @@ def _pio_tx():
     wrap()
 
 
+def _find_byte(buf, target, start=0):
+    """Index of the first target byte in buf, or -1 (no bytes([p]) alloc)."""
+    i = start
+    n = len(buf)
+    while i < n:
+        if buf[i] == target:
+            return i
+        i += 1
+    return -1
+
+
+def _calc_pid(fid):
+    """Protected Identifier from 6-bit frame ID (builds _PID_TABLE)."""
+    b = [(fid >> i) & 1 for i in range(6)]
+    p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
+    p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
+    return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+
+
+# Branch-free end-around-carry fold; the RP2040 port always has viper
+@micropython.viper
+def _chk(data, pid: int) -> int:
+    s = pid
+    n = int(len(data))
+    i = 0
+    while i < n:
+        s += int(data[i])
+        s = (s & 0xFF) + (s >> 8)   # end-around carry, no branch
+        i += 1
+    return (~s) & 0xFF
+
+
 class LIN:
     _BRK = 1 << 8
     NAD = 0x02
+    _PID_TABLE = bytes(_calc_pid(i) for i in range(64))
+    # Diagnostic response header, pre-inverted: break, sync, PID(0x3D)
+    _PID_3D = _PID_TABLE[0x3D]
+    _HDR_3D = array("I", (_BRK, 0x55 ^ 0xFF, _PID_3D ^ 0xFF))
 
     def __init__(self, tx=0, rx=1, baud=19200):
         self.uart = UART(0, baudrate=baud, tx=Pin(12), rx=Pin(rx),
@@ -72,61 +111,65 @@ class LIN:
             0, _pio_tx, freq=baud * 8,
             out_base=Pin(tx), set_base=Pin(tx))
         self.sm.active(1)
+        self._poller = select.poll()
+        self._poller.register(self.uart, select.POLLIN)
+        # RX lands here via readinto(); _rx() copies out only what arrived
+        self._rx_buf = bytearray(16)
+        self._rx_mv = memoryview(self._rx_buf)
+        # 0x3C request payload, rewritten in place for every diag request
+        self._diag_buf = bytearray(8)
         print("LIN: TX=GPIO%d RX=GPIO%d %dbaud" % (tx, rx, baud))
 
     @staticmethod
     def pid(fid):
-        b = [(fid >> i) & 1 for i in range(6)]
-        p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
-        p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
-        return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+        return LIN._PID_TABLE[fid & 0x3F]
 
     @staticmethod
     def chk(data, pid=None):
-        s = pid if pid is not None else 0
-        for v in data:
-            s += v
-            if s > 255:
-                s -= 255
-        return (~s) & 0xFF
-
-    def _brk(self):
-        self.sm.put(self._BRK)
-        time.sleep_us(200)
-
-    def _tx(self, b):
-        self.sm.put(b ^ 0xFF)
-        time.sleep_us(200)
+        return _chk(data, pid if pid is not None else 0)
 
     def _flush(self):
-        while self.uart.any():
-            self.uart.read()
+        self.uart.read()            # drains everything pending, or None
 
     def _rx(self, n=11, tmo=50):
+        mv = self._rx_mv
+        n = min(n, len(mv))
+        off = 0
         t0 = time.ticks_ms()
-        buf = b""
-        while time.ticks_diff(time.ticks_ms(), t0) < tmo:
-            if self.uart.any():
-                c = self.uart.read()
-                if c:
-                    buf += c
-                if len(buf) >= n:
-                    break
-        return buf
+        while off < n:
+            # Block in C until bytes arrive or the time budget runs out
+            rem = tmo - time.ticks_diff(time.ticks_ms(), t0)
+            if rem <= 0 or not self._poller.poll(rem):
+                break
+            k = self.uart.readinto(mv[off:], n - off)
+            if k:
+                off += k
+        return bytes(mv[:off])
 
     def header(self, fid):
         p = self.pid(fid)
         self._flush()
-        self._brk()
-        self._tx(0x55)
-        self._tx(p)
+        # Fits the 4-word FIFO; PIO paces the bytes, no sleeps needed
+        self.sm.put(array("I", (self._BRK, 0x55 ^ 0xFF, p ^ 0xFF)))
         return p
 
+    def header_3d(self):
+        """header(0x3D) with the header words prebuilt; returns the PID."""
+        self._flush()
+        self.sm.put(self._HDR_3D)
+        return self._PID_3D
+
     def send(self, fid, data, enhanced=True):
-        p = self.header(fid)
+        p = self.pid(fid)
+        # Whole frame goes to the PIO FIFO in one put; PIO paces the bytes
+        words = array("I", [self._BRK, 0x55 ^ 0xFF, p ^ 0xFF])
         for b in data:
-            self._tx(b)
-        self._tx(self.chk(data, p if enhanced else None))
+            words.append(b ^ 0xFF)
+        words.append(self.chk(data, p if enhanced else None) ^ 0xFF)
+        self._flush()
+        self.sm.put(words)
+        while self.sm.tx_fifo():
+            pass
         time.sleep_us(300)
 
     def recv(self, fid, tmo=50):
@@ -134,9 +177,8 @@ class LIN:
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = _find_byte(raw, p)
+        if idx < 0:
             return None
         pay = raw[idx + 1:]
         if len(pay) < 2:
@@ -151,24 +193,39 @@ class LIN:
 # Diagnostic primitives
 # ================================================================
 
+# Two-digit hex for every byte value
+_HEX = tuple("%02X" % i for i in range(256))
+
+
 def _h(data):
-    return " ".join("%02X" % b for b in data)
+    return " ".join(_HEX[b] for b in data)
+
+
+# Printable ASCII as itself, anything else as "."
+_ASC = tuple(chr(i) if 0x20 <= i <= 0x7E else "." for i in range(256))
+
+
+def _asc(data):
+    return "".join(_ASC[b] for b in data)
 
 
 def _send_3c(lin, payload):
-    while len(payload) < 8:
-        payload.append(0xFF)
-    lin.send(0x3C, payload[:8], enhanced=False)
+    buf = lin._diag_buf
+    n = min(len(payload), 8)
+    for i in range(n):
+        buf[i] = payload[i]
+    for i in range(n, 8):
+        buf[i] = 0xFF
+    lin.send(0x3C, buf, enhanced=False)
 
 
 def _recv_3d(lin, tmo=100):
-    p = lin.header(0x3D)
+    p = lin.header_3d()
     raw = lin._rx(11, tmo)
     if not raw or len(raw) < 3:
         return None
-    try:
-        idx = raw.index(bytes([p]))
-    except ValueError:
+    idx = _find_byte(raw, p)
+    if idx < 0:
         return None
     pay = raw[idx + 1:]
     if len(pay) < 2:
@@ -179,8 +236,12 @@ def _recv_3d(lin, tmo=100):
     return None
 
 
-def _diag(lin, sid, data, nad=None):
-    """Send diagnostic request, handle SF and auto-CF multi-frame (no FC)."""
+def _diag(lin, sid, data, nad=None, sf_only=False):
+    """Send diagnostic request, handle SF and auto-CF multi-frame (no FC).
+
+    sf_only: on a First Frame return only its payload bytes and skip the
+    CF loop; enough for existence scans, re-read later for full data.
+    """
     if nad is None:
         nad = lin.NAD
 
@@ -197,15 +258,21 @@ def _diag(lin, sid, data, nad=None):
     # Single Frame
     if pci_type == 0:
         pci_len = resp[1] & 0x0F
-        return resp[2:2 + pci_len]
+        return bytes(resp[2:2 + pci_len])
 
     # First Frame — sensor auto-sends CFs, NO Flow Control needed
     if pci_type == 1:
+        if sf_only:
+            return bytes(resp[3:])
         total_len = ((resp[1] & 0x0F) << 8) | resp[2]
-        collected = list(resp[3:])  # up to 5 bytes from FF
+        # Reassemble in place: up to 5 bytes from FF, then CFs
+        out = bytearray(total_len)
+        mv = memoryview(out)
+        off = min(len(resp) - 3, total_len)
+        mv[:off] = bytes(resp[3:3 + off])
 
         retries = 0
-        while len(collected) < total_len and retries < 20:
+        while off < total_len and retries < 20:
             cf = _recv_3d(lin, tmo=120)
             if not cf or cf[0] != nad:
                 retries += 1
@@ -215,11 +282,13 @@ def _diag(lin, sid, data, nad=None):
             if cf_type != 2:
                 retries += 1
                 continue
-            collected.extend(cf[2:])
+            chunk = min(len(cf) - 2, total_len - off)
+            mv[off:off + chunk] = bytes(cf[2:2 + chunk])
+            off += chunk
             retries = 0
             time.sleep_ms(2)
 
-        return collected[:total_len]
+        return bytes(mv[:off])
 
     return None
 
@@ -254,13 +323,7 @@ def read_lid(lid, verbose=True):
     if resp and len(resp) >= 2 and resp[0] == 0x61:
         data = resp[2:]
         if verbose:
-            # Try ASCII decode
-            asc = ""
-            for b in data:
-                if 0x20 <= b <= 0x7E:
-                    asc += chr(b)
-                else:
-                    asc += "."
+            asc = _asc(data)
             print("LID 0x%02X [%2d]: [%s]  %s" % (lid, len(data), _h(data), asc))
         return data
     elif resp and len(resp) >= 3 and resp[0] == 0x7F:
@@ -298,12 +361,7 @@ def read_did(did, verbose=True):
     if resp and len(resp) >= 3 and resp[0] == 0x62:
         data = resp[3:]
         if verbose:
-            asc = ""
-            for b in data:
-                if 0x20 <= b <= 0x7E:
-                    asc += chr(b)
-                else:
-                    asc += "."
+            asc = _asc(data)
             print("DID 0x%04X [%2d]: [%s]  %s" % (did, len(data), _h(data), asc))
         return data
     return None
@@ -317,26 +375,37 @@ def scan_dids(start=0x0580, end=0x0800):
     for did in range(start, end + 1):
         dh = (did >> 8) & 0xFF
         dl = did & 0xFF
-        resp = _diag(lin, 0x22, [dh, dl])
+        # Existence probe only: a multi-frame hit stops at its First Frame
+        resp = _diag(lin, 0x22, [dh, dl], sf_only=True)
         if resp and len(resp) >= 3 and resp[0] == 0x62:
-            data = resp[3:]
-            asc = ""
-            for b in data:
-                asc += chr(b) if 0x20 <= b <= 0x7E else "."
-            print("  0x%04X [%2d]: [%s]  %s" % (did, len(data), _h(data), asc))
-            hits[did] = data
-
-        # Also check write-ability
-        if resp and len(resp) >= 3 and resp[0] == 0x62:
-            wresp = _diag(lin, 0x2E, [dh, dl] + list(data))
-            if wresp and len(wresp) >= 1 and wresp[0] == 0x6E:
-                print("         ^ WRITABLE (echo-write OK)")
-
-        time.sleep_ms(5)
+            hits[did] = resp[3:]        # prefix; full read in pass two
+            print("  0x%04X hit" % did)
+
+        # Only a final NRC (not busy / response pending) means the slave
+        # is idle again. A hit may be a First Frame with CFs still queued.
+        final = (resp and len(resp) > 2 and resp[0] == 0x7F
+                 and resp[2] not in (0x21, 0x78))
+        time.sleep_ms(1 if final else 5)
         if (did - start) % 128 == 127:
             print("  ... 0x%04X" % did)
 
     print("Found %d DIDs." % len(hits))
+
+    # Second pass: full read of each hit, then echo-write it back
+    for did in hits:
+        dh = (did >> 8) & 0xFF
+        dl = did & 0xFF
+        resp = _diag(lin, 0x22, [dh, dl])
+        time.sleep_ms(5)
+        if not resp or len(resp) < 3 or resp[0] != 0x62:
+            continue
+        data = resp[3:]
+        hits[did] = data
+        print("  0x%04X [%2d]: [%s]  %s" % (did, len(data), _h(data), _asc(data)))
+        wresp = _diag(lin, 0x2E, [dh, dl] + list(data))
+        if wresp and len(wresp) >= 1 and wresp[0] == 0x6E:
+            print("  0x%04X WRITABLE (echo-write OK)" % did)
+        time.sleep_ms(5)
     return hits
 
 
@@ -381,14 +450,18 @@ def restore_coding():
 # FIR check (more thorough)
 # ================================================================
 
-def _check_fir(lin, cmd_fid=0x20, cmd_pay=None, cycles=40):
+def _check_fir(lin, cmd_fid=0x20, cmd_pay=None, cycles=40, idle_exit=5):
     """
     Send master command for N cycles, poll 0x30 each time.
     Returns (active, rain_data) where active means non-zero non-default.
+    Gives up early after idle_exit identical inactive 0x30 frames in a
+    row (0 = always run all cycles).
     """
     if cmd_pay is None:
         cmd_pay = [0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x00, 0x00]
 
+    last = None
+    same = 0
     for _ in range(cycles):
         lin.send(cmd_fid, cmd_pay)
         time.sleep_ms(5)
@@ -397,6 +470,14 @@ def _check_fir(lin, cmd_fid=0x20, cmd_pay=None, cycles=40):
             b0, b1 = d[0], d[1]
             if b0 != 0 and b0 < 0xFE and b1 != 0 and b1 < 0xFE:
                 return True, d
+            # Steady idle frame: this combination is not waking the FIR
+            if d == last:
+                same += 1
+                if idle_exit and same >= idle_exit:
+                    break
+            else:
+                last = d
+                same = 1
         lin.recv(0x23, tmo=20)
         time.sleep_ms(5)
     return False, None
@@ -427,52 +508,56 @@ MASTER_PAYLOADS = [
     [0xC1, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00],
 ]
 
-# Coding value candidates — systematic bit exploration
+# Every (frame ID, payload) command pair, flattened once at import
+_CMD_GRID = tuple((fid, bytes(pay))
+                  for fid in MASTER_FIDS for pay in MASTER_PAYLOADS)
+
+# Coding value candidates — systematic bit exploration (3 bytes each)
 CODING_VALUES = [
     # Original value
-    [0x02, 0x00, 0x5D],
+    b"\x02\x00\x5D",
     # Single-bit toggles on byte[0] (from original 0x02)
-    [0x03, 0x00, 0x5D],
-    [0x06, 0x00, 0x5D],
-    [0x0A, 0x00, 0x5D],
-    [0x12, 0x00, 0x5D],
-    [0x22, 0x00, 0x5D],
-    [0x42, 0x00, 0x5D],
-    [0x82, 0x00, 0x5D],
+    b"\x03\x00\x5D",
+    b"\x06\x00\x5D",
+    b"\x0A\x00\x5D",
+    b"\x12\x00\x5D",
+    b"\x22\x00\x5D",
+    b"\x42\x00\x5D",
+    b"\x82\x00\x5D",
     # Byte[0] common values
-    [0x00, 0x00, 0x5D],
-    [0x01, 0x00, 0x5D],
-    [0x04, 0x00, 0x5D],
-    [0x07, 0x00, 0x5D],
-    [0x0F, 0x00, 0x5D],
-    [0xFF, 0x00, 0x5D],
+    b"\x00\x00\x5D",
+    b"\x01\x00\x5D",
+    b"\x04\x00\x5D",
+    b"\x07\x00\x5D",
+    b"\x0F\x00\x5D",
+    b"\xFF\x00\x5D",
     # Byte[2] toggles (from original 0x5D = 0101_1101)
-    [0x02, 0x00, 0x5F],  # bit1 set
-    [0x02, 0x00, 0x5C],  # bit0 clear
-    [0x02, 0x00, 0x7D],  # bit5 set
-    [0x02, 0x00, 0xDD],  # bit7 set
-    [0x02, 0x00, 0xFF],
-    [0x02, 0x00, 0x00],
+    b"\x02\x00\x5F",  # bit1 set
+    b"\x02\x00\x5C",  # bit0 clear
+    b"\x02\x00\x7D",  # bit5 set
+    b"\x02\x00\xDD",  # bit7 set
+    b"\x02\x00\xFF",
+    b"\x02\x00\x00",
     # Byte[1] (from original 0x00)
-    [0x02, 0x01, 0x5D],
-    [0x02, 0x02, 0x5D],
-    [0x02, 0x04, 0x5D],
-    [0x02, 0x08, 0x5D],
-    [0x02, 0x10, 0x5D],
-    [0x02, 0x20, 0x5D],
-    [0x02, 0x40, 0x5D],
-    [0x02, 0x80, 0x5D],
-    [0x02, 0xFF, 0x5D],
+    b"\x02\x01\x5D",
+    b"\x02\x02\x5D",
+    b"\x02\x04\x5D",
+    b"\x02\x08\x5D",
+    b"\x02\x10\x5D",
+    b"\x02\x20\x5D",
+    b"\x02\x40\x5D",
+    b"\x02\x80\x5D",
+    b"\x02\xFF\x5D",
     # All-same patterns
-    [0x00, 0x00, 0x00],
-    [0x01, 0x01, 0x01],
-    [0xFF, 0xFF, 0xFF],
-    [0x07, 0x07, 0x07],
+    b"\x00\x00\x00",
+    b"\x01\x01\x01",
+    b"\xFF\xFF\xFF",
+    b"\x07\x07\x07",
     # Known VAG coding patterns
-    [0x00, 0x03, 0x4D],
-    [0x03, 0x03, 0x4D],
-    [0x01, 0x00, 0x00],
-    [0x00, 0x00, 0x01],
+    b"\x00\x03\x4D",
+    b"\x03\x03\x4D",
+    b"\x01\x00\x00",
+    b"\x00\x00\x01",
 ]
 
 
@@ -493,7 +578,7 @@ def combo(verbose=True):
 
     hits = []
     tested = 0
-    total = len(CODING_VALUES) * len(MASTER_FIDS) * len(MASTER_PAYLOADS)
+    total = len(CODING_VALUES) * len(_CMD_GRID)
 
     for ci, coding in enumerate(CODING_VALUES):
         # Write coding
@@ -513,16 +598,14 @@ def combo(verbose=True):
                     ci + 1, len(CODING_VALUES), _h(coding), _h(readback)))
 
         # Sweep master commands
-        for fid in MASTER_FIDS:
-            for pay in MASTER_PAYLOADS:
-                active, rd = _check_fir(lin, cmd_fid=fid, cmd_pay=pay,
-                                        cycles=25)
-                tested += 1
-
-                if active:
-                    print("*** HIT! coding=[%s] fid=0x%02X pay=[%s] rain=[%s]" % (
-                        _h(coding), fid, _h(pay), _h(rd)))
-                    hits.append((coding, fid, pay, rd))
+        for fid, pay in _CMD_GRID:
+            active, rd = _check_fir(lin, cmd_fid=fid, cmd_pay=pay, cycles=25)
+            tested += 1
+
+            if active:
+                print("*** HIT! coding=[%s] fid=0x%02X pay=[%s] rain=[%s]" % (
+                    _h(coding), fid, _h(pay), _h(rd)))
+                hits.append((coding, fid, pay, rd))
 
         if verbose and (ci + 1) % 4 == 0:
             print("  Progress: %d/%d codings, %d/%d combos" % (
@@ -20,7 +20,9 @@ Run:  just execute the file, or:
 """
 
 import rp2
+import micropython
 from machine import Pin, UART
+from binascii import hexlify
 import time
 
 
@@ -55,8 +57,21 @@ def _pio_tx():
     wrap()
 
 
+# One-byte search keys for every PID value, so RX parsing never allocates
+_PID_BYTES = tuple(bytes((i,)) for i in range(256))
+
+
+def _calc_pid(fid):
+    """Protected Identifier from 6-bit frame ID (builds _PID_TABLE)."""
+    b = [(fid >> i) & 1 for i in range(6)]
+    p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
+    p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
+    return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+
+
 class LIN:
     _BRK = 1 << 8
+    _PID_TABLE = bytes(_calc_pid(i) for i in range(64))
 
     def __init__(self, tx=0, rx=1, baud=19200):
         self.uart = UART(0, baudrate=baud, tx=Pin(12), rx=Pin(rx),
@@ -69,18 +84,14 @@ class LIN:
 
     @staticmethod
     def pid(fid):
-        b = [(fid >> i) & 1 for i in range(6)]
-        p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
-        p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
-        return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+        return LIN._PID_TABLE[fid & 0x3F]
 
     @staticmethod
     def chk(data, pid=None):
-        s = pid if pid is not None else 0
-        for v in data:
-            s += v
-            if s > 255:
-                s -= 255
+        s = sum(data) + (pid if pid is not None else 0)
+        # End-around carry, same as subtracting 255 on each overflow
+        s = (s & 0xFF) + (s >> 8)
+        s = (s & 0xFF) + (s >> 8)
         return (~s) & 0xFF
 
     def _brk(self):
@@ -92,20 +103,20 @@ class LIN:
         time.sleep_us(200)
 
     def _flush(self):
-        while self.uart.any():
-            self.uart.read()
+        self.uart.read()            # drains everything pending, or None
 
     def _rx(self, n=11, tmo=50):
         t0 = time.ticks_ms()
-        buf = b""
+        buf = bytearray()
         while time.ticks_diff(time.ticks_ms(), t0) < tmo:
             if self.uart.any():
                 c = self.uart.read()
                 if c:
-                    buf += c
+                    buf.extend(c)
                 if len(buf) >= n:
                     break
-        return buf
+        # bytes, not bytearray: callers find() the PID in it
+        return bytes(buf)
 
     def header(self, fid):
         p = self.pid(fid)
@@ -127,9 +138,8 @@ class LIN:
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None, False
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = raw.find(_PID_BYTES[p])
+        if idx < 0:
             return None, False
         pay = raw[idx + 1:]
         if len(pay) < 2:
@@ -143,15 +153,26 @@ class LIN:
 # ================================================================
 
 def _h(data):
-    return " ".join("%02X" % b for b in data)
+    # One C call instead of a per-byte format/join
+    return hexlify(bytes(data), " ").decode().upper()
+
+
+# 0x3C request frame, rewritten in place by every diag_send()
+_TX_BUF = bytearray(8)
 
 
 def diag_send(lin, nad, pci, sid, data, pad=0xFF):
     """Send diagnostic master request on 0x3C (classic checksum)."""
-    payload = [nad, pci, sid] + list(data)
-    while len(payload) < 8:
-        payload.append(pad)
-    lin.send(0x3C, payload, enhanced=False)
+    buf = _TX_BUF
+    buf[0] = nad
+    buf[1] = pci
+    buf[2] = sid
+    n = min(len(data), 5)
+    for i in range(n):
+        buf[3 + i] = data[i]
+    for i in range(3 + n, 8):
+        buf[i] = pad
+    lin.send(0x3C, buf, enhanced=False)
 
 
 def diag_recv(lin, tmo=100):
@@ -161,9 +182,8 @@ def diag_recv(lin, tmo=100):
     raw = lin._rx(11, tmo)
     if not raw or len(raw) < 3:
         return None, False
-    try:
-        idx = raw.index(bytes([p]))
-    except ValueError:
+    idx = raw.find(_PID_BYTES[p])
+    if idx < 0:
         return None, False
     pay = raw[idx + 1:]
     if len(pay) < 2:
@@ -174,16 +194,50 @@ def diag_recv(lin, tmo=100):
     return data, ok
 
 
-def diag_request(lin, nad, pci, sid, data, pad=0xFF):
-    """Send diagnostic request and read response. Returns response or None."""
-    diag_send(lin, nad, pci, sid, data, pad)
-    time.sleep_ms(20)
-    resp, ok = diag_recv(lin, tmo=100)
+# Post-send gap before the 0x3D poll: shrinks while the slave answers,
+# backs off when an answer only came on the re-poll. send() returns with
+# up to ~3 ms of the 0x3C frame still in the PIO FIFO/shifter, so the
+# floor leaves the slave a couple of ms after the frame really ends.
+_GAP_MIN = 6
+_GAP_START = 10
+_GAP_MAX = 20
+_gap_ms = _GAP_START
+_gap_nad = -1       # NAD the gap was learned on
+
+
+def _poll_after_gap(lin, nad, tmo):
+    """
+    Wait the adaptive gap, then poll 0x3D. If nothing valid came back
+    early, wait out the rest of _GAP_MAX and poll once more, so a gap
+    that was too short never turns an answer into a miss.
+    Returns response or None.
+    """
+    global _gap_ms, _gap_nad
+    if nad != _gap_nad:
+        # Timing learned on another NAD (or a dead one) does not carry over
+        _gap_ms = _GAP_START
+        _gap_nad = nad
+    time.sleep_ms(_gap_ms)
+    resp, ok = diag_recv(lin, tmo=tmo)
     if resp and ok:
+        _gap_ms = max(_GAP_MIN, _gap_ms - 1)
+        return resp
+    if _gap_ms >= _GAP_MAX:
+        return None
+    time.sleep_ms(_GAP_MAX - _gap_ms)
+    resp, ok = diag_recv(lin, tmo=tmo)
+    if resp and ok:
+        _gap_ms = min(_GAP_MAX, _gap_ms * 2)
         return resp
     return None
 
 
+def diag_request(lin, nad, pci, sid, data, pad=0xFF):
+    """Send diagnostic request and read response. Returns response or None."""
+    diag_send(lin, nad, pci, sid, data, pad)
+    return _poll_after_gap(lin, nad, 100)
+
+
 def is_positive(resp, sid):
     """Check if diagnostic response is positive (SID + 0x40)."""
     if not resp or len(resp) < 3:
@@ -234,6 +288,64 @@ def wake_sensor(lin):
 # Main Diagnostic Fuzzer
 # ================================================================
 
+# Print PHASE 7 raw hits as they happen. Set False when running
+# headless: they still land in the final summary, and the sweep is not
+# held up by USB-CDC output.
+DEBUG = True
+
+# PHASE 4 re-enters the extended session once this much time has
+# passed, well inside the usual 5 s S3 server timeout
+_SESSION_REFRESH_MS = 2000
+
+# PHASE 7 early exits: a SID sweep of a NAD/PCI that has not answered
+# at all stops after this many silent probes in a row, counted from the
+# first non-reserved SID; a NAD is dropped after that many aborted sweeps
+_RAW_FIRST_SID = 0x10
+_RAW_MISS_ABORT = 32
+_RAW_DEAD_ABORTS = 2
+
+
+@micropython.native
+def _raw_sid_sweep(lin, buf, findings):
+    """
+    PHASE 7 inner loop: send buf on 0x3C with every SID in buf[2] and
+    log answers that are not a plain rejection. buf holds NAD and PCI.
+    Returns True if the sweep was aborted early on a dead streak.
+    Any valid answer, NRC 0x11 included, shows the slave is listening;
+    from then on the sweep runs to SID 0xFF, since real services sit in
+    sparse islands (0x10-0x3E, 0x83-0x87, 0xB0-0xB7).
+    """
+    send = lin.send
+    sleep_ms = time.sleep_ms
+    nad = buf[0]
+    pci = buf[1]
+    miss = 0        # silent probes from _RAW_FIRST_SID on
+    live = False    # any valid answer seen in this sweep
+    for sid in range(0x100):
+        buf[2] = sid
+        send(0x3C, buf, enhanced=False)
+        resp = _poll_after_gap(lin, nad, 60)
+        if resp:
+            live = True
+            neg = is_negative(resp)
+            nrc = resp[4] if neg and len(resp) > 4 else -1
+            # Only log if it's not a simple negative
+            if not neg or (nrc >= 0 and nrc not in (0x11, 0x12, 0x31)):
+                if DEBUG:
+                    print("  NAD=0x%02X PCI=%d SID=0x%02X: [%s]" % (
+                        nad, pci, sid, _h(resp)))
+                findings.append(("RAW_RESP", nad, pci, sid, resp))
+        else:
+            sleep_ms(5)
+            # 0x00-0x0F are reserved: silence there proves nothing
+            if not live and sid >= _RAW_FIRST_SID:
+                miss += 1
+                # Silent NAD/PCI: stop the sweep
+                if miss >= _RAW_MISS_ABORT:
+                    return True
+    return False
+
+
 def run_diag():
     lin = LIN()
 
@@ -386,7 +498,7 @@ def run_diag():
             0x0200, 0x0201, 0x0202, 0x0203,
             0x0300, 0x0301, 0x0302, 0x0303,
         ]
-        for did in vag_dids:
+        for i, did in enumerate(vag_dids):
             dh = (did >> 8) & 0xFF
             dl = did & 0xFF
             resp = diag_request(lin, nad, 0x03, 0x22, [dh, dl])
@@ -402,7 +514,7 @@ def run_diag():
             time.sleep_ms(10)
 
             # Keep TesterPresent alive
-            if vag_dids.index(did) % 10 == 9:
+            if i % 10 == 9:
                 diag_request(lin, nad, 0x02, 0x3E, [0x00])
 
     # ==============================================================
@@ -435,19 +547,30 @@ def run_diag():
         [0xFF, 0xFF],
     ]
 
+    # DID header bytes and value lengths split once, not per write
+    coding = tuple((did, (did >> 8) & 0xFF, did & 0xFF) for did in coding_dids)
+    vals = tuple((len(v) + 3, bytes(v)) for v in coding_values)
+    scratch = bytearray(2 + max(len(v) for v in coding_values))
+    scratch_mv = memoryview(scratch)
+
     for nad in working_nads:
-        for did in coding_dids:
-            # Enter extended session
-            diag_request(lin, nad, 0x02, 0x10, [0x03])
-            time.sleep_ms(20)
+        # Enter extended session; re-entered only once it may have lapsed
+        diag_request(lin, nad, 0x02, 0x10, [0x03])
+        time.sleep_ms(20)
+        t_session = time.ticks_ms()
 
-            dh = (did >> 8) & 0xFF
-            dl = did & 0xFF
+        for did, dh, dl in coding:
+            if time.ticks_diff(time.ticks_ms(), t_session) > _SESSION_REFRESH_MS:
+                diag_request(lin, nad, 0x02, 0x10, [0x03])
+                time.sleep_ms(20)
+                t_session = time.ticks_ms()
 
-            for val in coding_values:
-                pci = len(val) + 3  # SID + DID_H + DID_L + data
-                data = [dh, dl] + val
-                resp = diag_request(lin, nad, pci, 0x2E, data)
+            scratch[0] = dh
+            scratch[1] = dl
+            for pci, val in vals:   # pci = SID + DID_H + DID_L + data
+                n = pci - 1
+                scratch[2:n] = val
+                resp = diag_request(lin, nad, pci, 0x2E, scratch_mv[:n])
 
                 if resp and is_positive(resp, 0x2E):
                     print("  WRITE OK! NAD=0x%02X DID=0x%04X val=[%s] resp=[%s]" % (
@@ -532,20 +655,14 @@ def run_diag():
         print("\nPHASE 7: Raw 0x3C brute-force (byte[0]=NAD, byte[1]=PCI sweep)")
         nads_to_try = working_nads if working_nads else [0x01, 0x7F, 0x22]
 
+        buf = bytearray(b"\x00\x00\x00\x01\xFF\xFF\xFF\xFF")
         for nad in nads_to_try:
+            aborts = 0
+            buf[0] = nad
             for pci in range(0x01, 0x08):
-                for sid in range(0x00, 0x100):
-                    payload = [nad, pci, sid, 0x01, 0xFF, 0xFF, 0xFF, 0xFF]
-                    lin.send(0x3C, payload, enhanced=False)
-                    time.sleep_ms(15)
-                    resp, ok = diag_recv(lin, tmo=60)
-                    if resp and ok:
-                        # Only log if it's not a simple negative
-                        if not is_negative(resp) or (len(resp) > 4 and resp[4] not in (0x11, 0x12, 0x31)):
-                            print("  NAD=0x%02X PCI=%d SID=0x%02X: [%s]" % (
-                                nad, pci, sid, _h(resp)))
-                            findings.append(("RAW_RESP", nad, pci, sid, resp))
-                    time.sleep_ms(5)
+                buf[1] = pci
+                if _raw_sid_sweep(lin, buf, findings):
+                    aborts += 1
 
                 # After each SID sweep, check FIR
                 active, rd = check_fir(lin, cycles=10)
@@ -555,6 +672,9 @@ def run_diag():
                     findings.append(("FIR_RAW", nad, pci, rd))
                     fir_activated = True
                     break
+                if aborts >= _RAW_DEAD_ABORTS:
+                    print("  NAD=0x%02X: no useful answers, skipping" % nad)
+                    break
             if fir_activated:
                 break
 
@@ -67,6 +67,9 @@ class LINMaster:
                                    out_base=Pin(tx_pin_num),
                                    set_base=Pin(tx_pin_num))
         self.sm.active(1)
+        # Only 64 frame IDs exist: PIDs and their NPN-inverted form once
+        self._pid = bytes(self.calculate_pid(i) for i in range(64))
+        self._pid_inv = bytes(p ^ 0xFF for p in self._pid)
         print(f"LIN Scanner: TX=GPIO{tx_pin_num}, RX=GPIO{rx_pin_num}, {baud} baud")
 
     def calculate_pid(self, frame_id):
@@ -81,45 +84,43 @@ class LINMaster:
         return (frame_id & 0x3F) | (p0 << 6) | (p1 << 7)
 
     def calculate_classic_checksum(self, data):
-        chk = 0
-        for b in data:
-            chk += b
-            if chk > 255:
-                chk -= 255
-        return (~chk) & 0xFF
+        return self.calculate_enhanced_checksum(0, data)
 
     def calculate_enhanced_checksum(self, pid, data):
-        chk = pid
-        for b in data:
-            chk += b
-            if chk > 255:
-                chk -= 255
+        chk = pid + sum(data)
+        # End-around carry, same as subtracting 255 on each overflow
+        chk = (chk & 0xFF) + (chk >> 8)
+        chk = (chk & 0xFF) + (chk >> 8)
         return (~chk) & 0xFF
 
     def send_header(self, frame_id):
-        pid = self.calculate_pid(frame_id)
-        while self.uart.any():
-            self.uart.read()
-        self.sm.put(pid ^ 0xFF)
-        return pid
+        frame_id &= 0x3F
+        self.uart.read()            # drains everything pending, or None
+        self.sm.put(self._pid_inv[frame_id])
+        return self._pid[frame_id]
 
     def read_response(self, length=11, timeout_ms=50):
         start = time.ticks_ms()
-        data = b''
+        data = bytearray()
         while time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
             if self.uart.any():
                 chunk = self.uart.read()
                 if chunk:
-                    data += chunk
+                    data.extend(chunk)
                 if len(data) >= length:
                     break
-        return data
+        # bytes, not bytearray: callers find() the PID in it
+        return bytes(data)
 
 
 # ==========================================
 # Scanner
 # ==========================================
 
+# One-byte search keys for every PID value, so RX parsing never allocates
+_PID_BYTES = tuple(bytes((i,)) for i in range(256))
+
+
 def _hex_list(data):
     return "[" + ", ".join("0x%02X" % b for b in data) + "]"
 
@@ -137,9 +138,8 @@ while True:
             raw = lin.read_response(length=11, timeout_ms=50)
 
             if raw and len(raw) > 1:
-                pid_byte = bytes([pid])
-                try:
-                    idx = raw.index(pid_byte)
+                idx = raw.find(_PID_BYTES[pid])
+                if idx >= 0:
                     payload = raw[idx + 1:]
 
                     if len(payload) >= 2:
@@ -163,9 +163,6 @@ while True:
                         found_any = True
                         time.sleep(0.5)
 
-                except ValueError:
-                    pass
-
             time.sleep(0.01)
 
         if not found_any:
@@ -15,7 +15,7 @@ Usage (REPL):
     read_coding()         # Read coding DID 0x0611
 """
 
-from lin import LIN, hex_str
+from lin import get_lin, hex_str, ascii_str
 import time
 
 
@@ -49,7 +49,7 @@ _lin = None
 def _get():
     global _lin
     if _lin is None:
-        _lin = LIN()
+        _lin = get_lin()
         # Wait for sensor to respond
         for _ in range(10):
             d, ok = _lin.recv(0x23, tmo=80)
@@ -59,6 +59,19 @@ def _get():
     return _lin
 
 
+# Positive-response SID -> header length before the payload
+_POS_HDR = {0x61: 2, 0x62: 3}
+
+
+def _payload(resp, pos):
+    """Payload of a positive response with SID pos, or None."""
+    if resp:
+        n = _POS_HDR[pos]
+        if resp[0] == pos and len(resp) >= n:
+            return resp[n:]
+    return None
+
+
 # ================================================================
 # LID reading — SID 0x21 (ReadDataByLocalIdentifier)
 # ================================================================
@@ -97,8 +110,8 @@ def read_lid(lid, verbose=True):
     """Read local identifier with multi-frame support."""
     lin = _get()
     resp = lin.diag(0x21, [lid])
-    if resp and len(resp) >= 2 and resp[0] == 0x61:
-        data = resp[2:]
+    data = _payload(resp, 0x61)
+    if data is not None:
         if verbose:
             chs = decode_lid_channels(data)
             vals = " | ".join("ch%d=%5d(0x%04X)" % (i, v, v)
@@ -137,12 +150,10 @@ def read_did(did, verbose=True):
     dh = (did >> 8) & 0xFF
     dl = did & 0xFF
     resp = lin.diag(0x22, [dh, dl])
-    if resp and len(resp) >= 3 and resp[0] == 0x62:
-        data = resp[3:]
+    data = _payload(resp, 0x62)
+    if data is not None:
         if verbose:
-            asc = ""
-            for b in data:
-                asc += chr(b) if 0x20 <= b <= 0x7E else "."
+            asc = ascii_str(data)
             print("DID 0x%04X [%2d]: [%s]  %s" % (
                 did, len(data), hex_str(data), asc))
         return data
@@ -158,15 +169,18 @@ def scan_dids(start=0x0580, end=0x0800):
         dh = (did >> 8) & 0xFF
         dl = did & 0xFF
         resp = lin.diag(0x22, [dh, dl])
-        if resp and len(resp) >= 3 and resp[0] == 0x62:
-            data = resp[3:]
-            asc = ""
-            for b in data:
-                asc += chr(b) if 0x20 <= b <= 0x7E else "."
+        data = _payload(resp, 0x62)
+        if data is not None:
+            asc = ascii_str(data)
             print("  0x%04X [%2d]: [%s]  %s" % (
                 did, len(data), hex_str(data), asc))
             hits[did] = data
-        time.sleep_ms(5)
+        # Only a finished answer (positive, or an NRC other than busy /
+        # response pending) means the slave is idle again: short gap
+        final = data is not None or (
+            resp and len(resp) > 2 and resp[0] == 0x7F
+            and resp[2] not in (0x21, 0x78))
+        time.sleep_ms(1 if final else 5)
         if (did - start) % 128 == 127:
             print("  ... 0x%04X" % did)
     print("Found %d DIDs." % len(hits))
@@ -293,8 +307,8 @@ def monitor(lids=None, full=False):
 
             for lid in read_lids:
                 resp = lin.diag(0x21, [lid])
-                if resp and len(resp) >= 2 and resp[0] == 0x61:
-                    data = resp[2:]
+                data = _payload(resp, 0x61)
+                if data is not None:
                     chs = decode_lid_channels(data)
                     vals = [v for _, v in chs]
 
@@ -473,8 +487,8 @@ def stream(lids=None):
 
             for lid in lids:
                 resp = lin.diag(0x21, [lid])
-                if resp and len(resp) >= 2 and resp[0] == 0x61:
-                    data = resp[2:]
+                data = _payload(resp, 0x61)
+                if data is not None:
                     chs = decode_lid_channels(data)
                     vals = ",".join(str(v) for _, v in chs)
                     print("D:%02X:%s" % (lid, vals))
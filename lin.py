@@ -9,13 +9,16 @@ Hardware: RP2040 + NPN transistor LIN transceiver
 
 Usage:
     from lin import LIN
-    bus = LIN()
+    bus = LIN()              # or get_lin() to share one instance
     bus.send(0x20, [0x81, 0x04, 0x02, 0, 0, 0, 0, 0])
     data, ok = bus.recv(0x23)
 """
 
 import rp2
+import micropython
 from machine import Pin, UART
+from array import array
+import select
 import time
 
 
@@ -59,11 +62,44 @@ def _pio_tx():
 # LIN Master
 # ================================================================
 
+def _find_byte(buf, target, start=0):
+    """Index of the first target byte in buf, or -1 (no bytes([p]) alloc)."""
+    i = start
+    n = len(buf)
+    while i < n:
+        if buf[i] == target:
+            return i
+        i += 1
+    return -1
+
+
+def _calc_pid(fid):
+    """Protected Identifier from 6-bit frame ID (builds _PID_TABLE)."""
+    b = [(fid >> i) & 1 for i in range(6)]
+    p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
+    p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
+    return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+
+
+# Branch-free end-around-carry fold; the RP2040 port always has viper
+@micropython.viper
+def _chk(data, pid: int) -> int:
+    s = pid
+    n = int(len(data))
+    i = 0
+    while i < n:
+        s += int(data[i])
+        s = (s & 0xFF) + (s >> 8)   # end-around carry, no branch
+        i += 1
+    return (~s) & 0xFF
+
+
 class LIN:
     """LIN 2.x master. PIO for TX, hardware UART for RX."""
 
     _BRK = 1 << 8      # Break command word for PIO
     NAD = 0x02          # Slave Node Address (81A 955 555 A)
+    _PID_TABLE = bytes(_calc_pid(i) for i in range(64))
 
     def __init__(self, tx=0, rx=1, baud=19200):
         self.uart = UART(0, baudrate=baud, tx=Pin(12), rx=Pin(rx),
@@ -72,6 +108,13 @@ class LIN:
             0, _pio_tx, freq=baud * 8,
             out_base=Pin(tx), set_base=Pin(tx))
         self.sm.active(1)
+        self._poller = select.poll()
+        self._poller.register(self.uart, select.POLLIN)
+        # RX lands here via readinto(); _rx() copies out only what arrived
+        self._rx_buf = bytearray(16)
+        self._rx_mv = memoryview(self._rx_buf)
+        # 0x3C request payload, rewritten in place for every diag request
+        self._diag_buf = bytearray(8)
         print("LIN: TX=GPIO%d RX=GPIO%d %dbaud" % (tx, rx, baud))
 
     # --- Static helpers ---
@@ -79,46 +122,32 @@ class LIN:
     @staticmethod
     def pid(fid):
         """Protected Identifier from 6-bit frame ID."""
-        b = [(fid >> i) & 1 for i in range(6)]
-        p0 = b[0] ^ b[1] ^ b[2] ^ b[4]
-        p1 = ~(b[1] ^ b[3] ^ b[4] ^ b[5]) & 1
-        return (fid & 0x3F) | (p0 << 6) | (p1 << 7)
+        return LIN._PID_TABLE[fid & 0x3F]
 
     @staticmethod
     def chk(data, pid=None):
         """Checksum. Enhanced if pid given, else Classic."""
-        s = pid if pid is not None else 0
-        for v in data:
-            s += v
-            if s > 255:
-                s -= 255
-        return (~s) & 0xFF
+        return _chk(data, pid if pid is not None else 0)
 
     # --- Low-level TX/RX ---
 
-    def _brk(self):
-        self.sm.put(self._BRK)
-        time.sleep_us(200)
-
-    def _tx(self, b):
-        self.sm.put(b ^ 0xFF)
-        time.sleep_us(200)
-
     def _flush(self):
-        while self.uart.any():
-            self.uart.read()
+        self.uart.read()            # drains everything pending, or None
 
     def _rx(self, n=11, tmo=50):
+        mv = self._rx_mv
+        n = min(n, len(mv))
+        off = 0
         t0 = time.ticks_ms()
-        buf = b""
-        while time.ticks_diff(time.ticks_ms(), t0) < tmo:
-            if self.uart.any():
-                c = self.uart.read()
-                if c:
-                    buf += c
-                if len(buf) >= n:
-                    break
-        return buf
+        while off < n:
+            # Block in C until bytes arrive or the time budget runs out
+            rem = tmo - time.ticks_diff(time.ticks_ms(), t0)
+            if rem <= 0 or not self._poller.poll(rem):
+                break
+            k = self.uart.readinto(mv[off:], n - off)
+            if k:
+                off += k
+        return bytes(mv[:off])
 
     # --- Frame-level ---
 
@@ -126,17 +155,23 @@ class LIN:
         """Send Break + Sync + PID. Returns PID."""
         p = self.pid(fid)
         self._flush()
-        self._brk()
-        self._tx(0x55)
-        self._tx(p)
+        # Fits the 4-word FIFO; PIO paces the bytes, no sleeps needed
+        self.sm.put(array("I", (self._BRK, 0x55 ^ 0xFF, p ^ 0xFF)))
         return p
 
     def send(self, fid, data, enhanced=True):
         """Send master-request frame (header + data + checksum)."""
-        p = self.header(fid)
+        p = self.pid(fid)
+        # Whole frame goes to the PIO FIFO in one put; PIO paces the bytes
+        words = array("I", [self._BRK, 0x55 ^ 0xFF, p ^ 0xFF])
         for b in data:
-            self._tx(b)
-        self._tx(self.chk(data, p if enhanced else None))
+            words.append(b ^ 0xFF)
+        words.append(self.chk(data, p if enhanced else None) ^ 0xFF)
+        self._flush()
+        self.sm.put(words)
+        # Wait out the FIFO, then the last byte still in the shifter
+        while self.sm.tx_fifo():
+            pass
         time.sleep_us(300)
 
     def recv(self, fid, tmo=50):
@@ -145,9 +180,8 @@ class LIN:
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None, False
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = _find_byte(raw, p)
+        if idx < 0:
             return None, False
         pay = raw[idx + 1:]
         if len(pay) < 2:
@@ -159,9 +193,13 @@ class LIN:
 
     def diag_send(self, payload):
         """Send diagnostic request on frame 0x3C (Classic checksum)."""
-        while len(payload) < 8:
-            payload.append(0xFF)
-        self.send(0x3C, payload[:8], enhanced=False)
+        buf = self._diag_buf
+        n = min(len(payload), 8)
+        for i in range(n):
+            buf[i] = payload[i]
+        for i in range(n, 8):
+            buf[i] = 0xFF
+        self.send(0x3C, buf, enhanced=False)
 
     def diag_recv(self, tmo=100):
         """Receive diagnostic response from frame 0x3D (Classic checksum)."""
@@ -169,9 +207,8 @@ class LIN:
         raw = self._rx(11, tmo)
         if not raw or len(raw) < 3:
             return None
-        try:
-            idx = raw.index(bytes([p]))
-        except ValueError:
+        idx = _find_byte(raw, p)
+        if idx < 0:
             return None
         pay = raw[idx + 1:]
         if len(pay) < 2:
@@ -203,15 +240,19 @@ class LIN:
         # Single Frame
         if pci_type == 0:
             pci_len = resp[1] & 0x0F
-            return resp[2:2 + pci_len]
+            return bytes(resp[2:2 + pci_len])
 
         # First Frame — sensor auto-sends CFs, NO Flow Control needed
         if pci_type == 1:
             total_len = ((resp[1] & 0x0F) << 8) | resp[2]
-            collected = list(resp[3:])  # up to 5 bytes from FF
+            # Reassemble in place: up to 5 bytes from FF, then CFs
+            out = bytearray(total_len)
+            mv = memoryview(out)
+            off = min(len(resp) - 3, total_len)
+            mv[:off] = bytes(resp[3:3 + off])
 
             retries = 0
-            while len(collected) < total_len and retries < 20:
+            while off < total_len and retries < 20:
                 cf = self.diag_recv(tmo=120)
                 if not cf or cf[0] != nad:
                     retries += 1
@@ -221,15 +262,49 @@ class LIN:
                 if cf_type != 2:
                     retries += 1
                     continue
-                collected.extend(cf[2:])
+                chunk = min(len(cf) - 2, total_len - off)
+                mv[off:off + chunk] = bytes(cf[2:2 + chunk])
+                off += chunk
                 retries = 0
                 time.sleep_ms(2)
 
-            return collected[:total_len]
+            return bytes(mv[:off])
 
         return None
 
 
+# ================================================================
+# Shared instance
+# ================================================================
+
+_lin = None
+
+
+def get_lin():
+    """Return the shared LIN instance, creating it on first use.
+
+    Tools imported into the same REPL session reuse one PIO state
+    machine and UART instead of re-initialising the bus each time.
+    """
+    global _lin
+    if _lin is None:
+        _lin = LIN()
+    return _lin
+
+
+# Two-digit hex for every byte value
+_HEX = tuple("%02X" % i for i in range(256))
+
+
 def hex_str(data):
     """Format bytes as hex string."""
-    return " ".join("%02X" % b for b in data)
+    return " ".join(_HEX[b] for b in data)
+
+
+# Printable ASCII as itself, anything else as "."
+_ASC = tuple(chr(i) if 0x20 <= i <= 0x7E else "." for i in range(256))
+
+
+def ascii_str(data):
+    """Format bytes as an ASCII preview."""
+    return "".join(_ASC[b] for b in data)
@@ -18,7 +18,7 @@ Usage (REPL):
     run(verbose=True)        # Show raw frames
 """
 
-from lin import LIN
+from lin import get_lin
 import time
 
 
@@ -178,7 +178,7 @@ def run(cmd_id=None, wiper=1, sensitivity=2, verbose=False):
     if cmd_id is None:
         cmd_id = ID_CMD
 
-    lin = LIN()
+    lin = get_lin()
     sensor = Sensor()
     drl = DRL()
     cmd_data = _build_cmd(wiper=wiper, sensitivity=sensitivity)